@@ -6,26 +6,389 @@ to provide high-level operations for managing Docker images and containers.
 
 import docker
 from docker.errors import DockerException, ImageNotFound, BuildError, APIError
-from typing import Dict, List, Optional, Tuple, Union, Any
+from typing import Dict, List, Optional, Tuple, Union, Any, NamedTuple
 import logging
 import platform
 import os
+from pathlib import PureWindowsPath
 import time
 import socket
-import requests
-from requests.adapters import HTTPAdapter, Retry
+import struct
 import re
-import tempfile
+import selectors
+import shlex
+import string
 import subprocess
-import datetime
-import tarfile
-import io
+import json
+import hashlib
 import threading
-import traceback
+import functools
+from operator import itemgetter
+from datetime import datetime, timezone
+from collections import OrderedDict, deque
+import random
+import queue
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 
 # 设置日志记录器
 logger = logging.getLogger(__name__)
 
+
+class ParsedTag(NamedTuple):
+    """解析后的镜像标签，name不含registry前缀"""
+    name: str
+    version: str
+
+
+# 镜像标签: 可选的registry/命名空间前缀 + 名称 + ":" + 版本，版本中不能含"/"，
+# 因此"localhost:5000/foo"这类不带版本的标签不会被误解析为名称"localhost"；
+# 名称和版本中不能含"@"，"python@sha256:..."这类摘要引用没有版本部分
+_TAG_RE = re.compile(r'^(?:[^/]+/)*([^:/@]+):([^:/@]+)$')
+
+# 内存限制: 数字 + 可选单位(k/m/g，不区分大小写)，无单位时按字节数处理
+_MEM_RE = re.compile(r'^\s*(\d+)\s*([kmgKMG]?)\s*$')
+_MEM_MULT = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+# 容器统计信息中计算CPU和内存使用率所需的字段
+_CPU_STATS_FIELDS = itemgetter('cpu_usage', 'system_cpu_usage')
+_MEMORY_STATS_FIELDS = itemgetter('usage', 'limit')
+
+# SO_LINGER(开启, 0秒): 关闭时直接发送RST
+_LINGER_RESET = struct.pack('ii', 1, 0)
+
+# 可重试的网络错误: 构建和拉取各自的关键字合并为一个正则，一次扫描完成匹配
+_BUILD_NET_ERR_RE = re.compile('|'.join(map(re.escape, [
+    "tls handshake timeout", "connection refused", "network", "timeout", "i/o timeout",
+    "context deadline exceeded", "operation timed out", "temporary failure in name resolution",
+    "name or service not known", "could not resolve host"
+])), re.IGNORECASE)
+_PULL_NET_ERR_RE = re.compile('|'.join(map(re.escape, [
+    'timeout', 'connection refused', 'eof', 'network', 'unreachable', 'context deadline exceeded'
+])), re.IGNORECASE)
+
+# 从构建上下文读取文件的COPY/ADD指令(不含从其他阶段复制的--from=)
+_CONTEXT_COPY_RE = re.compile(r'^[ \t]*(?:COPY|ADD)[ \t]+(?![^\n]*--from=)', re.MULTILINE | re.IGNORECASE)
+
+# 构建上下文缺少COPY/ADD所需文件时的错误信息，这类错误重试也无法恢复
+_CONTEXT_MISSING_ERRORS = ("failed to compute cache key", "not found in build context", "no such file or directory")
+
+# Dockerfile中的FROM指令: 可选的--platform参数 + 镜像名称 + 可选的阶段别名，之后只允许注释，
+# group(1)为镜像名称，group(2)为别名；需配合_iter_from_instructions逐行匹配，跳过续行和heredoc内容
+_FROM_RE = re.compile(
+    r'[ \t]*FROM[ \t]+(?:--platform=\S+[ \t]+)?(?!--)([^\s#]+)(?:[ \t]+AS[ \t]+([\w.-]+))?[ \t]*(?:#.*)?$',
+    re.IGNORECASE
+)
+# heredoc起始标记，例如"RUN python - <<EOF"或"COPY <<-'END' /app/run.sh"，group(1)为-，group(2)为结束标记
+_HEREDOC_RE = re.compile(r'<<(-?)["\']?(\w+)["\']?')
+
+
+def _iter_from_instructions(dockerfile_content: str):
+    """
+    逐条找出Dockerfile中真正的FROM指令，跳过续行和heredoc内容(如其中Python代码的from x import y)
+    
+    Args:
+        dockerfile_content: Dockerfile内容
+        
+    Yields:
+        re.Match: _FROM_RE的匹配结果，位置相对于整个Dockerfile内容
+    """
+    pos = 0
+    continued = False
+    heredocs = deque()
+    for line in dockerfile_content.splitlines(keepends=True):
+        start, pos = pos, pos + len(line)
+        text = line.rstrip('\r\n')
+        if heredocs:
+            strip_tabs, delimiter = heredocs[0]
+            if (text.lstrip('\t') if strip_tabs else text) == delimiter:
+                heredocs.popleft()
+            continue
+        if not continued and (match := _FROM_RE.match(dockerfile_content, start, start + len(text))):
+            yield match
+        if not text.lstrip().startswith('#'):
+            heredocs.extend((bool(dash), delimiter) for dash, delimiter in _HEREDOC_RE.findall(text))
+            continued = text.rstrip().endswith('\\')
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_tag(img_tag: str) -> Optional[ParsedTag]:
+    """
+    将镜像标签解析为(名称, 版本)，例如"docker.io/library/python:3.9-slim" -> ("python", "3.9-slim")
+    
+    标签在多次调用之间会重复出现，因此结果缓存在模块级别
+    
+    Args:
+        img_tag: 镜像标签
+        
+    Returns:
+        ParsedTag: 解析结果，标签中没有版本部分时返回None
+    """
+    match = _TAG_RE.match(img_tag)
+    if match is None:
+        return None
+    return ParsedTag(match.group(1), match.group(2))
+
+
+class _ImageIndex(NamedTuple):
+    """本地镜像标签索引，用于按不同规则查找镜像"""
+    by_tag: Dict[str, Any]                              # 完整标签 -> 镜像
+    by_suffix: Dict[str, Tuple[str, Any]]               # 去掉registry前缀后的标签 -> (标签, 镜像)
+    by_name_version: Dict[ParsedTag, Tuple[str, Any]]   # (名称, 版本) -> (标签, 镜像)
+    by_name: Dict[str, List[Tuple[str, str, Any]]]      # 名称 -> [(版本, 标签, 镜像)]
+
+
+@functools.lru_cache(maxsize=1)
+def _platform_system() -> str:
+    """
+    当前操作系统名称，进程运行期间不会变化，只查询一次
+    
+    Returns:
+        str: 例如"Windows"、"Linux"
+    """
+    return platform.system()
+
+
+# BuildKit缓存挂载，注入到需要下载依赖的RUN指令中
+_PIP_CACHE_MOUNT = "--mount=type=cache,target=/root/.cache/pip,sharing=locked"
+_APT_CACHE_MOUNTS = (
+    "--mount=type=cache,target=/var/cache/apt,sharing=locked "
+    "--mount=type=cache,target=/var/lib/apt,sharing=locked"
+)
+# 官方Debian/Ubuntu镜像中的docker-clean会在每次apt-get后删除下载的包，使缓存挂载失效，注入apt缓存时一并删除
+_APT_KEEP_CACHE = "rm -f /etc/apt/apt.conf.d/docker-clean && "
+_RUN_RE = re.compile(r'^(\s*RUN\s+)(?!--mount)', re.IGNORECASE)
+_PIP_NO_CACHE_RE = re.compile(r'\s--no-cache-dir\b')
+_APT_LISTS_CLEANUP_RE = re.compile(r'rm\s+-rf\s+/var/lib/apt/lists/\*')
+
+# 从Python版本输出中提取版本号，例如"Python 3.9.18" -> "3.9.18"
+_PY_VER_RE = re.compile(r'(\d+\.\d+(\.\d+)?)')
+
+# 安装Jupyter内核的容器内脚本，$1为内核名称，每一步的结果以KEY=value的形式输出
+_KERNEL_INSTALL_SCRIPT = r"""
+PIP=$(command -v pip3 || command -v pip)
+echo "PIP=$PIP"
+[ -n "$PIP" ] || exit 0
+"$PIP" install --no-cache-dir --upgrade ipykernel > /tmp/ipykernel_install.log 2>&1
+INSTALL_RC=$?
+echo "INSTALL_RC=$INSTALL_RC"
+if [ "$INSTALL_RC" -ne 0 ]; then
+    tail -c 500 /tmp/ipykernel_install.log | sed 's/^/INSTALL_LOG=/'
+    exit 0
+fi
+PY=$(command -v python3 || command -v python)
+echo "PY=$PY"
+[ -n "$PY" ] || exit 0
+VER=$("$PY" -c 'import platform; print(platform.python_version())')
+echo "VER=$VER"
+[ -n "$VER" ] || exit 0
+"$PY" -m ipykernel install --name="$1" --display-name="Docker Image (Python $VER)" > /tmp/ipykernel_register.log 2>&1
+REGISTER_RC=$?
+echo "REGISTER_RC=$REGISTER_RC"
+sed 's/^/REGISTER_LOG=/' /tmp/ipykernel_register.log
+[ "$REGISTER_RC" -eq 0 ] || exit 0
+# 内核文件通常在注册命令返回时已写好，未找到时以指数退避短暂轮询(最多约1.5秒)
+for delay in 0.05 0.1 0.2 0.4 0.8 0; do
+    for f in /usr/local/share/jupyter/kernels/"$1"/kernel.json /usr/share/jupyter/kernels/"$1"/kernel.json \
+             /usr/local/share/jupyter/kernelspecs/"$1"/kernel.json /usr/share/jupyter/kernelspecs/"$1"/kernel.json; do
+        if [ -f "$f" ]; then echo "FOUND=$f"; exit 0; fi
+    done
+    sleep "$delay"
+done
+"""
+
+# 检查容器中Jupyter安装情况的脚本，只有在所有内核目录都不存在时才回退到jupyter kernelspec list
+_JUPYTER_CHECK_SCRIPT = r"""
+J=$(command -v jupyter || echo NOT_INSTALLED)
+echo "J=$J"
+[ "$J" = NOT_INSTALLED ] && exit 0
+found=0
+for d in /usr/local/share/jupyter/kernels /usr/share/jupyter/kernels /root/.local/share/jupyter/kernels; do
+    [ -d "$d" ] || continue
+    found=1
+    for k in "$d"/*; do
+        [ -d "$k" ] && echo "KERNEL=$(basename "$k") $k"
+    done
+done
+[ "$found" = 1 ] || "$J" kernelspec list 2>/dev/null | sed 's/^/KERNEL=/'
+"""
+
+# 准备Jupyter运行环境的容器内脚本，$1为之前记录的jupyter路径(可为空)，每一步的结果以KEY=value的形式输出
+_JUPYTER_BOOTSTRAP_SCRIPT = r"""
+echo "OS=$(. /etc/os-release 2>/dev/null && echo "$PRETTY_NAME")"
+# 终止现有的Jupyter进程；脚本自身的命令行也包含jupyter，不能直接用pkill -f
+PIDS=""
+for pid in $(pgrep -f 'jupyter|notebook'); do
+    [ "$pid" = "$$" ] || PIDS="$PIDS $pid"
+done
+if [ -n "$PIDS" ]; then
+    kill $PIDS 2>/dev/null
+    # 等待所有旧进程都退出(最多2秒)，避免新进程启动时端口仍被占用；
+    # kill -0同时检查多个PID时只要有一个已退出就会失败，因此逐个检查
+    for _ in 1 2 3 4 5 6 7 8 9 10; do
+        ALIVE=""
+        for pid in $PIDS; do
+            kill -0 "$pid" 2>/dev/null && ALIVE="$ALIVE $pid"
+        done
+        PIDS=$ALIVE
+        [ -n "$PIDS" ] || break
+        sleep 0.2
+    done
+fi
+if [ -n "$1" ] && [ -x "$1" ]; then
+    # 该容器已完成过检测和安装
+    J="$1"
+    echo "CACHED=1"
+    echo "INSTALL_RC=0"
+else
+    echo "PY=$( (python --version || python3 --version) 2>&1 | head -n 1)"
+    PIP=$(command -v pip3 || command -v pip)
+    echo "PIP=$PIP"
+    # 镜像构建时已预装Jupyter的直接跳过安装
+    if command -v jupyter > /dev/null && jupyter notebook --version > /dev/null 2>&1; then
+        echo "PREINSTALLED=1"
+        echo "INSTALL_RC=0"
+    else
+        # 缺少pip时直接失败，不在运行时联网安装
+        [ -n "$PIP" ] || exit 0
+        # 使用旧版本notebook避免配置兼容性问题
+        "$PIP" install --no-cache-dir 'notebook<7.0.0' > /tmp/jupyter_install.log 2>&1
+        INSTALL_RC=$?
+        echo "INSTALL_RC=$INSTALL_RC"
+        if [ "$INSTALL_RC" -ne 0 ]; then
+            tail -c 500 /tmp/jupyter_install.log | sed 's/^/INSTALL_LOG=/'
+            exit 0
+        fi
+    fi
+fi
+mkdir -p /workspace
+# 在启动新进程之前同步清空日志，就绪检测不会读到上一次运行的启动信息
+: > /var/log/jupyter.log
+echo "JUPYTER=${J:-$(command -v jupyter)}"
+"""
+
+# 设置DOCKER_PREINSTALL_JUPYTER=1时构建镜像追加的Jupyter预装层，容器启动时即可跳过安装；基础镜像没有pip时忽略失败
+# BuildKit构建时_inject_cache_mounts会去掉--no-cache-dir并加上pip缓存挂载，传统构建器下不会把pip缓存留在镜像中
+_JUPYTER_LAYER = """
+# 预装Jupyter
+RUN python3 -m pip install --no-cache-dir 'notebook<7.0.0' || python -m pip install --no-cache-dir 'notebook<7.0.0' || true
+"""
+
+# 预装Jupyter的派生镜像仓库名，标签为基础镜像ID，基础镜像重新构建或重新打标签后ID变化，旧的派生镜像自然不再命中
+_JUPYTER_IMAGE_REPO = "mlride-jupyter"
+
+# 派生镜像上记录基础镜像ID的标签，镜像列表中据此识别并隐藏派生镜像，需与下面Dockerfile中的LABEL一致
+_JUPYTER_IMAGE_LABEL = "mlride.jupyter.base"
+
+# 构建派生镜像的Dockerfile，只在基础镜像之上安装Jupyter，不包含任何容器中的用户数据；安装失败时不生成镜像
+_JUPYTER_IMAGE_DOCKERFILE = string.Template("""FROM $base
+LABEL mlride.jupyter.base=$base
+RUN python3 -m pip install --no-cache-dir 'notebook<7.0.0' || python -m pip install --no-cache-dir 'notebook<7.0.0'
+""")
+
+# Jupyter配置文件模板，$token需替换为Python字面量
+_JUPYTER_CONFIG_TMPL = string.Template("""
+c = get_config()
+
+# 同时支持新旧版本的配置
+c.ServerApp.ip = '0.0.0.0'  # 新版本
+c.ServerApp.port = $port
+c.ServerApp.token = $token
+c.ServerApp.notebook_dir = '/workspace'
+c.ServerApp.allow_root = True
+c.ServerApp.disable_check_xsrf = True
+c.ServerApp.allow_origin = '*'
+c.ServerApp.tornado_settings = {'headers': {'Content-Security-Policy': "frame-ancestors * 'self';"}}
+
+# 兼容旧版本配置
+c.NotebookApp.ip = '0.0.0.0'
+c.NotebookApp.port = $port
+c.NotebookApp.token = $token
+c.NotebookApp.notebook_dir = '/workspace'
+c.NotebookApp.allow_root = True
+c.NotebookApp.disable_check_xsrf = True
+c.NotebookApp.allow_origin = '*'
+c.NotebookApp.tornado_settings = {'headers': {'Content-Security-Policy': "frame-ancestors * 'self';"}}
+""")
+
+# 简化版Dockerfile使用的模式
+# Dockerfile指令关键字不区分大小写，匹配后统一转为大写再查找处理函数
+_DF_INSTRUCTION_RE = re.compile(r'^\s*([A-Z]+)(?:\s|$)', re.IGNORECASE)
+_DF_SKIP_RE = re.compile(r'^\s*(?:#|$)')
+_DF_ARG_NET_RE = re.compile(r'proxy|mirror', re.IGNORECASE)
+_DF_TORCH_RE = re.compile(r'torch', re.IGNORECASE)
+_DF_TORCH_CHECK_RE = re.compile(r'import torch.*(?:print|version)|(?:print|version).*import torch', re.IGNORECASE | re.DOTALL)
+_DF_PIP_RE = re.compile(r'^\s*RUN\s+pip|pip install', re.IGNORECASE)
+_DF_NET_RE = re.compile(r'apt-get|yum|http|wget|curl')
+_DF_TORCH_VER_RE = re.compile(r'torch==(\d+\.\d+\.\d+)')
+_DF_CUDA_VER_RE = re.compile(r'cuda:?(\d+\.\d+)')
+_DF_CU_INDEX_RE = re.compile(r'cu(\d+)')
+
+
+def _simplified_arg_reason(instruction: List[str]) -> Optional[str]:
+    """保留ARG指令，除了与网络相关的"""
+    return '可能与网络相关' if _DF_ARG_NET_RE.search(instruction[0]) else None
+
+
+def _simplified_run_reason(instruction: List[str]) -> Optional[str]:
+    """判断RUN指令是否需要从简化版Dockerfile中移除"""
+    text = '\n'.join(instruction)
+    
+    # 特殊处理PyTorch安装命令：保留简单的PyTorch验证命令，其余使用预构建的PyTorch镜像替代
+    if _DF_TORCH_RE.search(text):
+        if _DF_TORCH_CHECK_RE.search(text):
+            return None
+        return '使用预构建PyTorch镜像替代'
+    
+    # pip安装需要网络
+    if _DF_PIP_RE.search(text):
+        return '需要网络'
+    
+    # 保留目录创建命令
+    if 'mkdir' in text:
+        return None
+    
+    # 其他需要网络的命令
+    if _DF_NET_RE.search(text):
+        return '需要网络'
+    
+    return None
+
+
+def _simplified_other_reason(instruction: List[str]) -> Optional[str]:
+    """其余指令(WORKDIR、ENV、COPY、CMD等)原样保留，但其中任何一行包含pip安装时移除"""
+    return '需要网络' if any('pip install' in line for line in instruction) else None
+
+
+# 需要特殊判断的指令 -> 判断函数，其余指令使用_simplified_other_reason
+_DF_REASON_HANDLERS = {
+    'ARG': _simplified_arg_reason,
+    'RUN': _simplified_run_reason,
+}
+
+# 会改变本地镜像列表的镜像事件
+_IMAGE_CHANGE_ACTIONS = frozenset({'pull', 'delete', 'tag', 'untag', 'import', 'load'})
+
+# Jupyter容器的固定配置，docker-py不会修改这些字典，可直接复用
+_JUPYTER_PORTS = {'8888/tcp': None}  # None会自动分配主机端口
+_JUPYTER_ENV = {
+    'JUPYTER_ENABLE_LAB': 'yes',  # 启用JupyterLab
+    'JUPYTER_TOKEN': '',          # 设置空token，无需密码
+    'JUPYTER_PASSWORD': '',       # 设置空密码
+    'JUPYTER_ALLOW_ORIGIN': '*',  # 允许跨域
+    'PYTHONPATH': '/workspace',   # 设置Python路径
+    'PYTHONUNBUFFERED': '1'      # 禁用Python输出缓冲
+}
+_JUPYTER_RESTART = {"Name": "unless-stopped"}
+_JUPYTER_HEALTHCHECK = {
+    # 镜像中不一定有curl(如python:*-slim)，用Python标准库探测；非2xx响应同样会抛出异常
+    "test": ["CMD", "python", "-c", "import urllib.request; urllib.request.urlopen('http://127.0.0.1:8888/api', timeout=5)"],
+    "interval": 30 * 10**9,  # 30秒
+    "timeout": 10 * 10**9,   # 10秒
+    "retries": 3,
+    "start_period": 30 * 10**9  # 30秒
+}
+
+
 class DockerClient:
     """
     Docker客户端类,提供Docker操作的高级接口
@@ -36,9 +399,102 @@ class DockerClient:
     3. 资源监控(CPU、内存使用情况)
     """
     
-    def __init__(self):
+    # get_container缓存的有效期(秒)和容量
+    CONTAINER_CACHE_TTL = 0.2
+    CONTAINER_CACHE_SIZE = 128
+    
+    # 构建失败时随BuildError返回的最近构建输出行数
+    BUILD_LOG_TAIL_LINES = 500
+    
+    # 诊断时读取的容器日志上限(字节)
+    DIAG_LOG_MAX_BYTES = 64 * 1024
+    
+    # 文件复制时tar流的管道缓冲区和tar记录块大小(字节)，大缓冲可减少大文件复制时的系统调用次数
+    COPY_PIPE_BUFFER_SIZE = 1 << 20
+    COPY_TAR_BUFSIZE = 1 << 16
+    
+    # 容器IP和端口映射缓存的有效期(纳秒)
+    CONTAINER_META_CACHE_TTL_NS = 2_000_000_000
+    
+    # 镜像Python版本缓存 {镜像ID: Python版本}，在所有实例间共享
+    PY_VER_CACHE_SIZE = 128
+    _py_ver_cache: "OrderedDict[str, str]" = OrderedDict()
+    _py_ver_cache_lock = threading.Lock()
+    
+    # 添加了中国镜像源的Dockerfile缓存 {原始内容摘要: 转换结果}，转换是确定性的，无需失效
+    MIRRORS_CACHE_SIZE = 128
+    _mirrors_cache: "OrderedDict[bytes, str]" = OrderedDict()
+    _mirrors_cache_lock = threading.Lock()
+    
+    # 已完成Jupyter环境准备的容器 {容器ID: {'PY', 'PIP', 'JUPYTER'}}，在所有实例间共享
+    _container_env_cache: Dict[str, Dict[str, str]] = {}
+    
+    # 正在后台构建预装Jupyter派生镜像的基础镜像ID，避免重复构建
+    _jupyter_image_builds: set = set()
+    _jupyter_image_builds_lock = threading.Lock()
+    
+    # Docker API连接池大小
+    API_POOL_SIZE = 32
+    
+    # 有连接方式探测成功后，继续等待更高优先级方式的最长时间(秒)
+    CONNECT_PRIORITY_GRACE = 0.5
+    
+    # 并发执行短小的Docker API查询(如多个基础镜像的存在性检查)的线程池，在所有实例间共享
+    _io_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='docker-io')
+    
+    # 本地镜像列表缓存的有效期(秒)，镜像变化时会通过事件流提前失效
+    IMAGES_CACHE_TTL = float(os.environ.get("DOCKER_IMAGES_CACHE_TTL", "2"))
+    
+    # 已确认存在的镜像引用缓存的容量和有效期(秒)，镜像变化时整体失效
+    IMAGE_PRESENT_CACHE_SIZE = 256
+    IMAGE_PRESENT_CACHE_TTL = 30
+    
+    # 订阅容器事件时等待事件流连接的最长时间(秒)
+    EVENT_STREAM_CONNECT_TIMEOUT = 2
+    
+    # 服务就绪检查两轮探测之间等待容器事件的初始和最长时间(秒)，每轮翻倍，服务很快就绪时可及时发现
+    READY_POLL_MIN_INTERVAL = 0.05
+    READY_POLL_MAX_INTERVAL = 1.0
+    
+    # 等待Jupyter服务启动的最长时间(秒)
+    JUPYTER_START_TIMEOUT = 60
+    
+    # 在容器中执行命令时使用的标准PATH
+    _CONTAINER_ENV = {'PATH': '/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin'}
+    
+    # 进程内共享的实例
+    _instance: Optional["DockerClient"] = None
+    _instance_lock = threading.Lock()
+    
+    def __new__(cls):
         """
-        初始化Docker客户端
+        返回进程内共享的DockerClient实例
+        
+        视图每次请求都会调用DockerClient()，共享实例使连接池、事件流和各类缓存在请求之间复用，
+        也不必每次都重新探测连接方式；创建失败时不保存实例，下次调用会重试
+        """
+        instance = cls._instance
+        if instance is None:
+            with cls._instance_lock:
+                instance = cls._instance
+                if instance is None:
+                    instance = super().__new__(cls)
+                    instance._setup()
+                    cls._instance = instance
+        return instance
+    
+    def close(self):
+        """
+        关闭与Docker守护进程的连接，之后调用DockerClient()会创建新的实例
+        """
+        with DockerClient._instance_lock:
+            if DockerClient._instance is self:
+                DockerClient._instance = None
+        self.client.close()
+    
+    def _setup(self):
+        """
+        初始化Docker客户端，只在创建共享实例时执行一次
         """
         self.logger = logging.getLogger(__name__)
         
@@ -46,9 +502,31 @@ class DockerClient:
         self.timeout = int(os.environ.get("DOCKER_API_TIMEOUT", "180"))  # 默认180秒超时
         self.max_retries = int(os.environ.get("DOCKER_API_RETRIES", "3"))  # 默认3次重试
         
+        # 容器对象的短期缓存，同一请求内的连续操作共享一次inspect结果
+        self._container_cache: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._container_cache_lock = threading.Lock()
+        # 容器网络信息缓存 {容器完整ID: (获取时间ns, {'ip', 'ports'})}
+        self._container_meta_cache: Dict[str, Tuple[int, Dict]] = {}
+        
+        # 上一次CPU采样 {容器完整ID: (total_usage, system_cpu_usage, 采样时间)}，用于计算单次读取之间的差值
+        self._prev_cpu: Dict[str, Tuple[int, int, float]] = {}
+        # 最近一次统计结果 {容器完整ID: (采样时间, 结果)}，短时间内的重复查询直接返回缓存
+        self._stats_cache: Dict[str, Tuple[float, Dict]] = {}
+        
+        # 本地镜像列表缓存 (获取时间, 镜像列表)
+        self._images_cache: Optional[Tuple[float, List]] = None
+        # 基于镜像列表快照构建的标签索引 (镜像列表, 索引)
+        self._image_index: Optional[Tuple[List, _ImageIndex]] = None
+        # 已确认存在的镜像引用 {"名称:标签": 确认时间}，按最近使用排序
+        self._image_present_cache: "OrderedDict[str, float]" = OrderedDict()
+        self._images_cache_lock = threading.Lock()
+        
+        # docker buildx是否可用，首次构建时检测
+        self._buildx_available: Optional[bool] = None
+        
         # 检查操作系统
-        self.is_windows = platform.system().lower() == 'windows'
-        self.logger.info(f"操作系统: {platform.system()}")
+        self.is_windows = _platform_system().lower() == 'windows'
+        self.logger.info(f"操作系统: {_platform_system()}")
         
         # 设置Windows环境下的Docker Host
         if self.is_windows and not os.environ.get('DOCKER_HOST'):
@@ -57,60 +535,50 @@ class DockerClient:
             os.environ['DOCKER_HOST'] = 'tcp://localhost:2375'
             self.logger.info("Windows环境: 自动设置DOCKER_HOST=tcp://localhost:2375")
             
-            # 创建配置文件目录
+            # 保存Docker配置到文件，以便后续使用；放到后台线程，不阻塞客户端初始化
             config_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config')
-            os.makedirs(config_dir, exist_ok=True)
-            
-            # 保存Docker配置到文件，以便后续使用
             config_path = os.path.join(config_dir, 'docker_config.json')
-            try:
-                with open(config_path, 'w') as f:
-                    import json
-                    json.dump({
-                        'docker_host': 'tcp://localhost:2375',
-                        'os': platform.system(),
-                        'last_update': str(datetime.datetime.now())
-                    }, f, indent=2)
-                self.logger.info(f"Docker连接配置已保存到 {config_path}")
-            except Exception as e:
-                self.logger.warning(f"保存Docker配置失败: {str(e)}")
+            threading.Thread(
+                target=self._save_docker_config,
+                args=(config_path, 'tcp://localhost:2375'),
+                name='docker-config-writer',
+                daemon=True
+            ).start()
+        
+        # 初始化Docker客户端，连接时的version()请求同时用于确认Docker守护进程正在运行
+        self._init_client()
+    
+    def _save_docker_config(self, config_path: str, docker_host: str):
+        """
+        保存Docker连接配置到文件
+        
+        配置未变化时跳过写入；写入时先写临时文件再替换，避免留下不完整的配置文件
         
-        # 检查Docker Desktop是否运行
+        Args:
+            config_path: 配置文件路径
+            docker_host: Docker主机地址
+        """
         try:
-            if self.is_windows:
-                # Windows上使用tasklist检查Docker进程
-                docker_running = False
-                
-                try:
-                    # 检查Docker Desktop进程
-                    result = subprocess.run(['tasklist', '/FI', 'IMAGENAME eq Docker Desktop.exe'], 
-                                           capture_output=True, text=True, check=False)
-                    if 'Docker Desktop.exe' in result.stdout:
-                        docker_running = True
-                        self.logger.info("Docker Desktop进程正在运行")
-                    else:
-                        # 检查Docker Engine服务
-                        result = subprocess.run(['sc', 'query', 'docker'], 
-                                               capture_output=True, text=True, check=False)
-                        if 'RUNNING' in result.stdout:
-                            docker_running = True
-                            self.logger.info("Docker Engine服务正在运行")
-                except Exception as e:
-                    self.logger.warning(f"检查Docker进程失败: {str(e)}")
-                    
-                if not docker_running:
-                    self.logger.error("Docker Desktop可能未运行")
-                    raise Exception("请确保Docker Desktop已启动并正在运行")
-            else:
-                # 非Windows系统使用docker info命令
-                subprocess.run(['docker', 'info'], capture_output=True, check=True)
-                self.logger.info("Docker正在运行")
-        except Exception as e:
-            self.logger.error(f"Docker可能未运行: {str(e)}")
-            raise Exception("请确保Docker已启动并正在运行")
+            os.makedirs(os.path.dirname(config_path), exist_ok=True)
+            with open(config_path, 'r') as f:
+                if json.load(f).get('docker_host') == docker_host:
+                    return
+        except (OSError, ValueError):
+            pass
         
-        # 初始化Docker客户端
-        self._init_client()
+        payload = {
+            'docker_host': docker_host,
+            'os': _platform_system(),
+            'last_update': int(time.time())
+        }
+        try:
+            tmp_path = config_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(payload, f, indent=2)
+            os.replace(tmp_path, config_path)
+            self.logger.info(f"Docker连接配置已保存到 {config_path}")
+        except Exception as e:
+            self.logger.warning(f"保存Docker配置失败: {str(e)}")
     
     def _init_client(self):
         """
@@ -127,7 +595,7 @@ class DockerClient:
             connection_methods.append(('环境变量DOCKER_HOST', {'base_url': docker_host}))
         
         # 识别操作系统
-        is_windows = platform.system().lower() == 'windows'
+        is_windows = self.is_windows
         
         # Windows环境下的Docker连接方式（按优先级排序）
         if is_windows:
@@ -146,12 +614,15 @@ class DockerClient:
             # 尝试获取Docker Context信息，自动检测正确的连接方式
             try:
                 docker_context_cmd = ["docker", "context", "inspect"]
-                result = subprocess.run(docker_context_cmd, capture_output=True, text=True, check=False)
+                result = subprocess.run(docker_context_cmd, capture_output=True, text=True, check=False, timeout=2)
                 if result.returncode == 0:
                     self.logger.info(f"获取到Docker Context信息: {result.stdout[:200]}...")
                     
-                    # 解析JSON输出
-                    if "EndpointName" in result.stdout and "wsl" in result.stdout.lower():
+                    # 解析JSON输出，只检查上下文名称和docker端点地址
+                    contexts = json.loads(result.stdout)
+                    ctx = contexts[0] if contexts else {}
+                    endpoint = ctx.get('Endpoints', {}).get('docker', {}).get('Host', '')
+                    if 'wsl' in endpoint.lower() or 'wsl' in ctx.get('Name', '').lower():
                         # 这可能是WSL模式
                         # WSL模式下TCP连接可能更稳定
                         connection_methods.insert(0, ('WSL Context检测', {'base_url': 'tcp://localhost:2375'}))
@@ -166,36 +637,85 @@ class DockerClient:
             ('TCP连接', {'base_url': 'tcp://localhost:2375'})
         ])
         
-        # 配置请求会话以添加重试逻辑
-        session = requests.Session()
-        retries = Retry(
-            total=self.max_retries,
-            backoff_factor=0.5,
-            status_forcelist=[500, 502, 503, 504]
-        )
-        session.mount('http://', HTTPAdapter(max_retries=retries))
-        session.mount('https://', HTTPAdapter(max_retries=retries))
-        
-        # 尝试连接直到成功
+        # 同时尝试所有连接方式，按优先级采用第一个成功的连接，总耗时不再是各方式失败耗时之和
         connection_errors = []
-        last_error = None
         
-        for method, params in connection_methods:
+        def probe(params):
+            client_params = {
+                **params,
+                'timeout': self.timeout,
+                # 扩大连接池，所有API调用复用保持连接的套接字(unix/npipe/tcp均适用)，不必反复建立连接
+                'num_pools': self.API_POOL_SIZE,
+                'max_pool_size': self.API_POOL_SIZE
+            }
+            client = docker.DockerClient(**client_params)
             try:
+                client.api._timeout = self.timeout
+                # 测试连接是否成功
+                return client, client.version()
+            except Exception:
+                client.close()
+                raise
+        
+        def close_unused(future):
+            if not future.cancelled() and future.exception() is None:
+                future.result()[0].close()
+        
+        # 相同的连接参数只尝试一次
+        unique_methods = []
+        seen_params = set()
+        for method, params in connection_methods:
+            key = tuple(sorted(params.items()))
+            if key not in seen_params:
+                seen_params.add(key)
+                unique_methods.append((method, params))
+        
+        executor = ThreadPoolExecutor(max_workers=len(unique_methods))
+        try:
+            attempts = {}
+            for rank, (method, params) in enumerate(unique_methods):
                 self.logger.info(f"尝试使用{method}连接Docker")
+                attempts[executor.submit(probe, params)] = (rank, method, params)
+            
+            # 按完成顺序处理探测结果，记录成功的最高优先级方式；比它优先级更高的方式都已结束时立即采用。
+            # 首次成功后最多再等待CONNECT_PRIORITY_GRACE秒，卡住的高优先级探测不会阻塞到超时
+            pending = set(attempts)
+            best = None
+            grace_deadline = None
+            while pending:
+                timeout = None if grace_deadline is None else max(0.0, grace_deadline - time.monotonic())
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    rank, method, params = attempts[future]
+                    try:
+                        future.result()
+                    except Exception as e:
+                        error_msg = f"使用{method}连接Docker失败: {str(e)}"
+                        self.logger.warning(error_msg)
+                        connection_errors.append(error_msg)
+                        continue
+                    if best is None or rank < best[0]:
+                        best = (rank, future)
+                    if grace_deadline is None:
+                        grace_deadline = time.monotonic() + self.CONNECT_PRIORITY_GRACE
+                if best is not None and all(attempts[other][0] > best[0] for other in pending):
+                    break
+            
+            if best is not None:
+                _, best_future = best
+                _, method, params = attempts[best_future]
+                client, version_info = best_future.result()
                 
-                # 添加超时设置并使用配置的会话
-                client_params = {
-                    **params,
-                    'timeout': self.timeout
-                }
-                
-                # 创建客户端
-                self.client = docker.DockerClient(**client_params)
-                self.client.api._timeout = self.timeout
+                # 其余连接方式即使成功也不再使用
+                for other in attempts:
+                    if other is not best_future:
+                        other.add_done_callback(close_unused)
                 
-                # 测试连接是否成功
-                version_info = self.client.version()
+                self.client = client
+                # 高频操作(统计、exec、删除、复制)直接使用低级API，与高级客户端共享同一个连接池
+                self.api = self.client.api
                 self.logger.info(f"Docker版本信息: {version_info.get('Version', 'unknown')}")
                 
                 # 检查API版本兼容性
@@ -207,18 +727,21 @@ class DockerClient:
                 self.logger.info(f"成功使用{method}连接到Docker")
                 self.connection_method = method
                 
+                # 容器生命周期事件的分发表，事件流在首次订阅时才打开
+                self._events: Dict[str, List[queue.Queue]] = {}
+                self._events_lock = threading.Lock()
+                self._event_thread = None
+                # 事件流已连接到守护进程时置位，订阅者等待它之后再触发操作，避免事件早于订阅到达而丢失
+                self._event_stream_ready = threading.Event()
+                
                 if self.is_windows:
                     # 对于Windows，保存成功的连接方式以供日后使用
                     if 'base_url' in params and params['base_url']:
                         self.logger.info(f"Windows环境成功连接Docker，建议设置环境变量: DOCKER_HOST={params['base_url']}")
                 
                 return  # 连接成功,退出初始化
-            except Exception as e:
-                error_msg = f"使用{method}连接Docker失败: {str(e)}"
-                self.logger.warning(error_msg)
-                connection_errors.append(error_msg)
-                last_error = e
-                continue  # 尝试下一个连接方式
+        finally:
+            executor.shutdown(wait=False)
         
         # 如果所有连接方式都失败
         error_msg = "无法连接到Docker服务。尝试了以下方法:\n" + "\n".join(connection_errors)
@@ -235,7 +758,7 @@ class DockerClient:
         # 收集系统信息以帮助诊断
         try:
             system_info = {
-                'platform': platform.system(),
+                'platform': _platform_system(),
                 'release': platform.release(),
                 'version': platform.version(),
                 'machine': platform.machine(),
@@ -269,6 +792,110 @@ class DockerClient:
         
         raise Exception(error_msg)
     
+    def _ensure_event_pump(self):
+        """
+        确保后台事件线程已启动
+        
+        整个客户端只保持一条Docker事件流，由后台线程将容器事件分发到各自的队列，
+        等待容器状态变化的方法只需在本地队列上阻塞，而不必反复查询Docker守护进程；
+        镜像事件用于使镜像列表缓存失效
+        """
+        with self._events_lock:
+            if self._event_thread is not None and self._event_thread.is_alive():
+                return
+            self._event_thread = threading.Thread(
+                target=self._event_pump,
+                name='docker-event-pump',
+                daemon=True
+            )
+            self._event_thread.start()
+    
+    def _event_pump(self):
+        """
+        读取Docker事件流，按容器ID将容器事件分发到每个订阅者的队列，镜像发生变化时使镜像列表缓存失效
+        """
+        try:
+            # events()在收到守护进程的响应头后才返回，此时订阅已生效
+            events = self.client.events(decode=True, filters={'type': ['container', 'image']})
+            self._event_stream_ready.set()
+            for event in events:
+                if event.get('Type') == 'image':
+                    if event.get('Action') in _IMAGE_CHANGE_ACTIONS:
+                        self._invalidate_images()
+                    continue
+                container_id = event.get('id') or event.get('Actor', {}).get('ID')
+                with self._events_lock:
+                    event_queues = list(self._events.get(container_id, ()))
+                for event_queue in event_queues:
+                    event_queue.put(event)
+        except Exception as e:
+            self.logger.warning(f"Docker事件流已断开: {str(e)}")
+        finally:
+            self._event_stream_ready.clear()
+    
+    def _subscribe_events(self, container_id: str) -> queue.Queue:
+        """
+        订阅指定容器的生命周期事件，返回前等待事件流连接完成
+        
+        每个订阅者拥有独立的队列，同一容器的多个等待者都能收到全部事件
+        
+        Args:
+            container_id: 容器完整ID
+            
+        Returns:
+            queue.Queue: 该订阅者接收容器事件的队列
+        """
+        event_queue = queue.Queue()
+        with self._events_lock:
+            self._events.setdefault(container_id, []).append(event_queue)
+        self._ensure_event_pump()
+        if not self._event_stream_ready.wait(timeout=self.EVENT_STREAM_CONNECT_TIMEOUT):
+            self.logger.warning(f"事件流未在 {self.EVENT_STREAM_CONNECT_TIMEOUT} 秒内连接，可能错过容器 {container_id[:12]} 的事件")
+        return event_queue
+    
+    def _unsubscribe_events(self, container_id: str, event_queue: queue.Queue):
+        """
+        取消订阅指定容器的生命周期事件，只移除该订阅者自己的队列
+        
+        Args:
+            container_id: 容器完整ID
+            event_queue: _subscribe_events返回的队列
+        """
+        with self._events_lock:
+            event_queues = self._events.get(container_id)
+            if event_queues is None:
+                return
+            try:
+                event_queues.remove(event_queue)
+            except ValueError:
+                pass
+            if not event_queues:
+                del self._events[container_id]
+    
+    def _wait_for_event(self, event_queue: queue.Queue, actions, timeout: float) -> Optional[Dict]:
+        """
+        在事件队列上等待指定类型的事件
+        
+        Args:
+            event_queue: _subscribe_events返回的队列
+            actions: 期望的事件类型集合，例如{'start'}
+            timeout: 超时时间(秒)
+            
+        Returns:
+            Optional[Dict]: 匹配的事件，超时返回None
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                event = event_queue.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if (event.get('Action') or event.get('status')) in actions:
+                return event
+    
     def list_images(self) -> List[Dict]:
         """
         获取所有Docker镜像列表
@@ -277,7 +904,7 @@ class DockerClient:
             List[Dict]: 镜像信息列表,每个镜像包含id、标签、大小等信息
         """
         try:
-            images = self.client.images.list()
+            images = self._get_images_cached()
             return [
                 {
                     'id': image.id,
@@ -291,6 +918,100 @@ class DockerClient:
             self.logger.error(f"Failed to list images: {str(e)}")
             raise
     
+    def _get_images_cached(self) -> List:
+        """
+        获取本地镜像列表，在IMAGES_CACHE_TTL内重复调用时复用同一份结果
+        
+        Returns:
+            List: 镜像对象列表
+        """
+        now = time.monotonic()
+        with self._images_cache_lock:
+            cached = self._images_cache
+        if cached is not None and now - cached[0] < self.IMAGES_CACHE_TTL:
+            return cached[1]
+        
+        # images.list()会对每个镜像再发一次inspect请求，这里直接使用/images/json的结果构造镜像对象，
+        # 其中已包含Id、RepoTags、Size、Created等字段；该接口的Created是Unix时间戳，
+        # 统一转换为inspect返回的ISO 8601格式，与其他方法返回的created保持一致
+        images = []
+        for attrs in self.api.images():
+            # 预装Jupyter的派生镜像是内部缓存，不展示给用户，也不参与镜像查找
+            if _JUPYTER_IMAGE_LABEL in (attrs.get('Labels') or {}):
+                continue
+            if isinstance(attrs.get('Created'), int):
+                attrs['Created'] = datetime.fromtimestamp(attrs['Created'], timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+            images.append(self.client.images.prepare_model(attrs))
+        with self._images_cache_lock:
+            self._images_cache = (now, images)
+        # 通过事件流感知其他进程对镜像的修改
+        self._ensure_event_pump()
+        return images
+    
+    def _get_image_index(self) -> "_ImageIndex":
+        """
+        获取本地镜像的标签索引，与镜像列表缓存使用同一份快照，快照更新后重新构建
+        
+        Returns:
+            _ImageIndex: 标签索引
+        """
+        images = self._get_images_cached()
+        with self._images_cache_lock:
+            cached = self._image_index
+        if cached is not None and cached[0] is images:
+            return cached[1]
+        
+        by_tag, by_suffix, by_name_version, by_name = {}, {}, {}, {}
+        for img in images:
+            for img_tag in img.tags:
+                by_tag.setdefault(img_tag, img)
+                # "docker.io/library/python:3.9-slim"可按"library/python:3.9-slim"和"python:3.9-slim"查找
+                slash = img_tag.find('/')
+                while slash != -1:
+                    by_suffix.setdefault(img_tag[slash + 1:], (img_tag, img))
+                    slash = img_tag.find('/', slash + 1)
+                parsed = _parse_tag(img_tag)
+                if parsed is not None:
+                    by_name_version.setdefault(parsed, (img_tag, img))
+                    by_name.setdefault(parsed.name, []).append((parsed.version, img_tag, img))
+        
+        index = _ImageIndex(by_tag, by_suffix, by_name_version, by_name)
+        with self._images_cache_lock:
+            self._image_index = (images, index)
+        return index
+    
+    def _invalidate_images(self):
+        """
+        使本地镜像列表缓存失效
+        """
+        with self._images_cache_lock:
+            self._images_cache = None
+            self._image_present_cache.clear()
+    
+    def _is_image_present(self, ref: str) -> bool:
+        """
+        检查镜像引用是否在IMAGE_PRESENT_CACHE_TTL内被确认存在过
+        """
+        with self._images_cache_lock:
+            checked_at = self._image_present_cache.get(ref)
+            if checked_at is None:
+                return False
+            if time.monotonic() - checked_at >= self.IMAGE_PRESENT_CACHE_TTL:
+                del self._image_present_cache[ref]
+                return False
+            self._image_present_cache.move_to_end(ref)
+            return True
+    
+    def _mark_image_present(self, ref: str):
+        """
+        记录镜像引用已确认存在
+        """
+        with self._images_cache_lock:
+            self._image_present_cache[ref] = time.monotonic()
+            self._image_present_cache.move_to_end(ref)
+            if len(self._image_present_cache) > self.IMAGE_PRESENT_CACHE_SIZE:
+                self._image_present_cache.popitem(last=False)
+    
     def pull_image(self, image_name: str, tag: str = 'latest') -> Dict:
         """
         拉取Docker镜像，尝试找到或拉取指定版本的镜像
@@ -310,19 +1031,16 @@ class DockerClient:
             # 首先尝试查找本地镜像
             try:
                 # 获取所有镜像
-                all_images = self.client.images.list()
+                all_images = self._get_images_cached()
                 
-                # 记录详细的镜像信息用于调试
-                self.logger.info(f"本地镜像总数: {len(all_images)}")
-                if len(all_images) > 0:
-                    all_tags_dict = {}
-                    for img in all_images:
-                        if img.tags:
-                            all_tags_dict[img.id[:12]] = img.tags
-                    self.logger.info(f"带标签的镜像: {all_tags_dict}")
+                # 记录详细的镜像信息用于调试，仅在DEBUG级别下构建
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    self.logger.debug("本地镜像总数: %s", len(all_images))
+                    all_tags_dict = {img.id[:12]: img.tags for img in all_images if img.tags}
+                    self.logger.debug("带标签的镜像: %s", all_tags_dict)
                 
                 # 尝试多种方式查找匹配的镜像
-                matched_image = self._find_local_image(image_name, tag, all_images)
+                matched_image = self._find_local_image(image_name, tag)
                 
                 if matched_image:
                     best_tag = self._get_best_matching_tag(matched_image, full_image_name)
@@ -340,56 +1058,49 @@ class DockerClient:
                 self.logger.warning(f"检查本地镜像时出错: {str(e)}")
             
             # 尝试拉取镜像，添加重试机制
-            return self._pull_remote_image(image_name, tag)
+            result = self._pull_remote_image(image_name, tag)
+            self._invalidate_images()
+            self._mark_image_present(full_image_name)
+            return result
             
         except Exception as e:
             self.logger.error(f"拉取镜像过程中出错: {str(e)}")
             raise
             
-    def _find_local_image(self, image_name, tag, all_images):
+    def _find_local_image(self, image_name, tag):
         """
         在本地查找匹配的镜像
         
         Args:
             image_name: 镜像名称
             tag: 镜像标签
-            all_images: 所有本地镜像
             
         Returns:
             找到的镜像对象，未找到返回None
         """
+        index = self._get_image_index()
         full_image_name = f"{image_name}:{tag}"
         self.logger.info(f"在本地查找镜像: {full_image_name}")
         
         # 1. 直接完全匹配 - "python:3.9-slim"
-        for img in all_images:
-            if full_image_name in img.tags:
-                self.logger.info(f"找到完全匹配的本地镜像: {full_image_name}, ID: {img.id[:12]}")
-                return img
+        img = index.by_tag.get(full_image_name)
+        if img is not None:
+            self.logger.info(f"找到完全匹配的本地镜像: {full_image_name}, ID: {img.id[:12]}")
+            return img
         
         # 2. 匹配带registry前缀的标签 - "docker.io/python:3.9-slim"
-        for img in all_images:
-            for img_tag in img.tags:
-                if img_tag.endswith(f"/{full_image_name}") or img_tag.endswith(full_image_name):
-                    self.logger.info(f"找到带registry前缀的匹配: {img_tag}, ID: {img.id[:12]}")
-                    return img
+        match = index.by_suffix.get(full_image_name)
+        if match is not None:
+            img_tag, img = match
+            self.logger.info(f"找到带registry前缀的匹配: {img_tag}, ID: {img.id[:12]}")
+            return img
         
         # 3. 分别解析名称和标签进行匹配
-        for img in all_images:
-            for img_tag in img.tags:
-                try:
-                    if ':' in img_tag:
-                        img_name, img_version = img_tag.rsplit(':', 1)
-                        # 处理registry前缀
-                        if '/' in img_name:
-                            img_name = img_name.split('/')[-1]
-                        
-                        self.logger.debug(f"比较: [{img_name}:{img_version}] 与请求的 [{image_name}:{tag}]")
-                        if img_name == image_name and img_version == tag:
-                            self.logger.info(f"找到名称和版本匹配: {img_tag}, ID: {img.id[:12]}")
-                            return img
-                except Exception:
-                    continue
+        match = index.by_name_version.get(ParsedTag(image_name, tag))
+        if match is not None:
+            img_tag, img = match
+            self.logger.info(f"找到名称和版本匹配: {img_tag}, ID: {img.id[:12]}")
+            return img
         
         # 4. 尝试更模糊的匹配，例如标签部分匹配
         if '-' in tag:  # 处理如"3.9-slim"这样的标签
@@ -397,19 +1108,10 @@ class DockerClient:
             self.logger.info(f"尝试以基础版本号 {base_version} 查找匹配")
             
             # 查找相同版本号的镜像
-            for img in all_images:
-                for img_tag in img.tags:
-                    try:
-                        if ':' in img_tag:
-                            img_name, img_version = img_tag.rsplit(':', 1)
-                            if '/' in img_name:
-                                img_name = img_name.split('/')[-1]
-                            
-                            if img_name == image_name and img_version.startswith(base_version):
-                                self.logger.info(f"找到版本号部分匹配: {img_tag}, ID: {img.id[:12]}")
-                                return img
-                    except Exception:
-                        continue
+            for version, img_tag, img in index.by_name.get(image_name, ()):
+                if version.startswith(base_version):
+                    self.logger.info(f"找到版本号部分匹配: {img_tag}, ID: {img.id[:12]}")
+                    return img
         
         # 没有找到匹配的镜像
         self.logger.info(f"未找到匹配的本地镜像: {full_image_name}")
@@ -426,16 +1128,16 @@ class DockerClient:
         Returns:
             最佳匹配的标签
         """
-        # 首先查找完全匹配
+        # 一次遍历同时记录完全匹配和包含首选标签的标签，按优先级返回
+        contains = None
         for tag in image.tags:
             if tag == preferred_tag:
                 return tag
-                
-        # 查找包含首选标签的标签
-        for tag in image.tags:
-            if preferred_tag in tag:
-                return tag
-                
+            if contains is None and preferred_tag in tag:
+                contains = tag
+        if contains is not None:
+            return contains
+        
         # 否则返回第一个标签
         if image.tags:
             return image.tags[0]
@@ -477,68 +1179,53 @@ class DockerClient:
             alternative_sources = cn_mirrors[image_name]
             self.logger.info(f"检测到 {image_name} 镜像，将尝试使用国内镜像源: {alternative_sources}")
         
-        # 首先尝试国内镜像源
+        # 首先尝试国内镜像源，所有镜像源同时拉取，采用最先成功的一个并中止其余的拉取
         if alternative_sources:
-            for mirror_source in alternative_sources:
-                try:
-                    self.logger.info(f"尝试从国内镜像源拉取: {mirror_source}:{tag}")
-                    self.client.api.pull(mirror_source, tag=tag)
-                    
-                    # 拉取成功后重新标记为原始镜像名
-                    self.client.api.tag(f"{mirror_source}:{tag}", image_name, tag=tag)
-                    
-                    # 获取标记后的镜像
-                    image = self.client.images.get(f"{image_name}:{tag}")
-                    
-                    self.logger.info(f"成功从国内镜像源 {mirror_source} 拉取并重命名为 {full_image_name}")
-                    return {
-                        'id': image.id,
-                        'tags': image.tags,
-                        'size': image.attrs['Size'],
-                        'created': image.attrs['Created'],
-                        'source': 'cn_mirror'
-                    }
-                except Exception as e:
-                    self.logger.warning(f"从国内镜像源 {mirror_source} 拉取失败: {str(e)}")
-                    continue
+            abort = threading.Event()
+            executor = ThreadPoolExecutor(max_workers=len(alternative_sources))
+            try:
+                pending = {
+                    executor.submit(self._stream_pull, mirror_source, tag, abort): mirror_source
+                    for mirror_source in alternative_sources
+                }
+                self.logger.info(f"同时从国内镜像源拉取: {alternative_sources}")
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        mirror_source = pending.pop(future)
+                        try:
+                            future.result()
+                        except Exception as e:
+                            self.logger.warning(f"从国内镜像源 {mirror_source} 拉取失败: {str(e)}")
+                            continue
+                        abort.set()
+                        
+                        # 拉取成功后重新标记为原始镜像名
+                        self.api.tag(f"{mirror_source}:{tag}", image_name, tag=tag)
+                        
+                        self.logger.info(f"成功从国内镜像源 {mirror_source} 拉取并重命名为 {full_image_name}")
+                        return self._inspect_image_info(full_image_name, 'cn_mirror')
+            finally:
+                abort.set()
+                executor.shutdown(wait=False)
         
         # 如果国内镜像源都失败，尝试原始镜像源
         while retry_count < max_pull_retries:
             try:
                 self.logger.info(f"从原始源拉取镜像: {full_image_name} (尝试 {retry_count + 1}/{max_pull_retries})")
                 
-                # 使用低级API拉取镜像
-                self.client.api.pull(image_name, tag=tag)
+                # 流式读取拉取进度，完成后只需一次inspect获取镜像信息
+                self._stream_pull(image_name, tag)
+                image_info = self._inspect_image_info(full_image_name, 'remote')
                 
-                # 尝试获取刚拉取的镜像
-                try:
-                    # 首先尝试完整名称
-                    image = self.client.images.get(full_image_name)
-                except ImageNotFound:
-                    # 如果找不到完整名称，则尝试搜索新拉取的镜像
-                    recent_images = self.client.images.list(name=image_name)
-                    for img in recent_images:
-                        if any(t.endswith(f":{tag}") for t in img.tags):
-                            image = img
-                            break
-                    else:
-                        raise Exception(f"成功拉取但无法找到镜像: {full_image_name}")
-                
-                self.logger.info(f"成功拉取镜像: {full_image_name}, ID: {image.id[:12]}, 标签: {image.tags}")
-                return {
-                    'id': image.id,
-                    'tags': image.tags,
-                    'size': image.attrs['Size'],
-                    'created': image.attrs['Created'],
-                    'source': 'remote'
-                }
+                self.logger.info(f"成功拉取镜像: {full_image_name}, ID: {image_info['id'][:12]}, 标签: {image_info['tags']}")
+                return image_info
             except DockerException as e:
                 pull_error = e
                 error_msg = str(e)
                 
                 # 检查是否是网络类型错误
-                is_network_error = any(network_err in error_msg.lower() for network_err in 
-                                      ['timeout', 'connection refused', 'eof', 'network', 'unreachable', 'context deadline exceeded'])
+                is_network_error = _PULL_NET_ERR_RE.search(error_msg) is not None
                 
                 if is_network_error:
                     retry_count += 1
@@ -560,6 +1247,57 @@ class DockerClient:
         # 如果代码执行到这里，说明遇到了未处理的情况
         raise Exception(f"拉取镜像 {full_image_name} 失败，原因未知")
     
+    def _stream_pull(self, repository: str, tag: str, abort: Optional[threading.Event] = None) -> bool:
+        """
+        以流式方式拉取镜像并逐条处理进度信息，abort被设置时关闭连接以中止拉取
+        
+        Args:
+            repository: 镜像仓库名称
+            tag: 镜像标签
+            abort: 中止信号，可选
+            
+        Returns:
+            bool: 拉取完成返回True，被中止返回False
+            
+        Raises:
+            DockerException: 拉取出错
+        """
+        stream = self.api.pull(repository, tag=tag, stream=True, decode=True)
+        try:
+            for event in stream:
+                if abort is not None and abort.is_set():
+                    return False
+                if 'error' in event:
+                    raise APIError(event['error'])
+                # 各层的下载进度只在调试级别记录
+                if 'id' in event:
+                    self.logger.debug(f"拉取 {repository}:{tag}: {event['id']} {event.get('status', '')}")
+                elif event.get('status'):
+                    self.logger.info(f"拉取 {repository}:{tag}: {event['status']}")
+        finally:
+            stream.close()
+        return True
+    
+    def _inspect_image_info(self, image_ref: str, source: str) -> Dict:
+        """
+        通过一次inspect请求获取镜像信息
+        
+        Args:
+            image_ref: 镜像名称或ID
+            source: 镜像来源
+            
+        Returns:
+            Dict: 镜像信息
+        """
+        attrs = self.api.inspect_image(image_ref)
+        return {
+            'id': attrs['Id'],
+            'tags': attrs.get('RepoTags') or [],
+            'size': attrs['Size'],
+            'created': attrs['Created'],
+            'source': source
+        }
+    
     def remove_image(self, image_id: str, force: bool = False) -> bool:
         """
         删除Docker镜像
@@ -572,12 +1310,41 @@ class DockerClient:
             bool: 删除是否成功
         """
         try:
+            self._remove_jupyter_image_of(image_id)
             self.client.images.remove(image_id, force=force)
+            self._invalidate_images()
             return True
         except DockerException as e:
             self.logger.error(f"Failed to remove image {image_id}: {str(e)}")
             raise
             
+    def _remove_jupyter_image_of(self, image_id: str):
+        """
+        删除镜像前先删除基于它构建的预装Jupyter的派生镜像，否则基础镜像因存在子镜像而无法删除
+        
+        只移除基础镜像的某个标签、镜像本身仍保留时不删除派生镜像
+        
+        Args:
+            image_id: 要删除的镜像ID或标签
+        """
+        try:
+            attrs = self.api.inspect_image(image_id)
+        except DockerException:
+            return
+        repo_tags = attrs.get('RepoTags') or []
+        if image_id in repo_tags and len(repo_tags) > 1:
+            return
+        derived = self._jupyter_image_name(attrs['Id'])
+        if not derived:
+            return
+        try:
+            self.api.remove_image(derived)
+            self.logger.info(f"已删除预装Jupyter的镜像 {derived}")
+        except ImageNotFound:
+            pass
+        except DockerException as e:
+            self.logger.warning(f"删除预装Jupyter的镜像 {derived} 失败: {str(e)}")
+    
     def create_container(
         self,
         image_name: str,
@@ -618,44 +1385,50 @@ class DockerClient:
             exposed_ports = None
             if ports:
                 # 转换为低级API需要的格式: {'8888/tcp': {}} 
-                exposed_ports = {}
-                for port_spec in ports:
-                    exposed_ports[port_spec] = {}
+                exposed_ports = {port_spec: {} for port_spec in ports}
                 container_config['ports'] = exposed_ports
                 
             # 添加环境变量
             if environment:
                 # 转换为低级API需要的格式: ["KEY=VALUE", ...]
-                env_list = [f"{key}={value}" for key, value in environment.items()]
+                env_list = ['%s=%s' % item for item in environment.items()]
                 container_config['environment'] = env_list
                 
             # 添加启动命令
             if command:
-                if isinstance(command, list):
-                    container_config['cmd'] = command
-                else:
-                    container_config['cmd'] = command.split()
+                # 字符串命令按shell规则拆分，保留引号内的空格
+                container_config['cmd'] = command if isinstance(command, list) else shlex.split(command, posix=not self.is_windows)
             
             # 处理挂载卷
             if volumes:
                 # 验证并规范化挂载卷配置
+                abs_paths = {host_path: os.path.abspath(host_path) for host_path in volumes}
+                # 按父目录分组，每个父目录只scandir一次，代替逐个exists检查
+                parent_entries = {}
+                for abs_host_path in abs_paths.values():
+                    parent = os.path.dirname(abs_host_path)
+                    if parent not in parent_entries:
+                        try:
+                            with os.scandir(parent) as it:
+                                parent_entries[parent] = {e.name for e in it}
+                        except OSError:
+                            parent_entries[parent] = set()
+                
                 normalized_volumes = {}
                 for host_path, mount_info in volumes.items():
-                    # 确保宿主机路径是绝对路径
-                    abs_host_path = os.path.abspath(host_path)
-                    # 确保宿主机目录存在
-                    if not os.path.exists(abs_host_path):
+                    abs_host_path = abs_paths[host_path]
+                    # 只对确实不存在的目录调用makedirs
+                    if os.path.basename(abs_host_path) not in parent_entries[os.path.dirname(abs_host_path)]:
                         os.makedirs(abs_host_path, exist_ok=True)
                         self.logger.info(f"创建宿主机挂载目录: {abs_host_path}")
                     
                     # 如果在Windows系统上，需要处理路径格式
                     if os.name == 'nt':
-                        # 转换Windows路径为Docker可接受的格式
-                        abs_host_path = abs_host_path.replace('\\', '/')
-                        # 确保路径格式正确，例如 C:/Users/... 而不是 C:\Users\...
-                        if ':' in abs_host_path:
-                            drive, path = abs_host_path.split(':', 1)
-                            abs_host_path = f"{drive.lower()}:{path}"
+                        # 转换Windows路径为Docker可接受的格式，例如 c:/Users/... 而不是 C:\Users\...
+                        win_path = PureWindowsPath(abs_host_path)
+                        abs_host_path = win_path.as_posix()
+                        if win_path.drive:
+                            abs_host_path = win_path.drive.lower() + abs_host_path[len(win_path.drive):]
                     
                     normalized_volumes[abs_host_path] = mount_info
                     self.logger.info(f"添加挂载: {abs_host_path} -> {mount_info['bind']}")
@@ -686,49 +1459,23 @@ class DockerClient:
                 host_config['cpu_quota'] = int(cpu_count * 100000)
                 
             if memory_limit:
-                # 移除单位后缀 (例如 '2048m' -> 2048)
-                if memory_limit.endswith('m'):
-                    mem_value = int(memory_limit[:-1]) * 1024 * 1024  # 转换为字节
-                elif memory_limit.endswith('g'):
-                    mem_value = int(memory_limit[:-1]) * 1024 * 1024 * 1024
-                else:
-                    # 假设已经是字节数
-                    mem_value = int(memory_limit)
-                    
-                host_config['mem_limit'] = mem_value
-            
-            # 创建主机配置
-            host_config_obj = None
-            if host_config:
-                host_config_obj = self.client.api.create_host_config(**host_config)
+                # 解析单位后缀并转换为字节 (例如 '2048m' -> 2048 * 1024 * 1024)
+                mem_match = _MEM_RE.match(str(memory_limit))
+                if not mem_match:
+                    raise ValueError(f"无效的内存限制: {memory_limit}")
+                host_config['mem_limit'] = int(mem_match.group(1)) * _MEM_MULT[mem_match.group(2).lower()]
+            
+            # 配置端口绑定，未指定主机端口时让Docker自动分配
+            if ports and 'port_bindings' not in host_config:
+                host_config['port_bindings'] = {
+                    port_spec: host_port or None for port_spec, host_port in ports.items()
+                }
             
-            # 配置端口绑定
-            port_bindings = None
-            if ports:
-                if not host_config_obj:
-                    # 如果没有其他host_config，创建一个只包含port_bindings的配置
-                    port_bindings = {}
-                    for port_spec, host_port in ports.items():
-                        if host_port:
-                            port_bindings[port_spec] = host_port
-                        else:
-                            # 如果没有指定主机端口，让Docker自动分配
-                            port_bindings[port_spec] = None
-                    host_config_obj = self.client.api.create_host_config(port_bindings=port_bindings)
-                elif 'port_bindings' not in host_config:
-                    # 如果有host_config但没有port_bindings，添加port_bindings
-                    port_bindings = {}
-                    for port_spec, host_port in ports.items():
-                        if host_port:
-                            port_bindings[port_spec] = host_port
-                        else:
-                            port_bindings[port_spec] = None
-                    # 重新创建host_config以包含port_bindings
-                    host_config['port_bindings'] = port_bindings
-                    host_config_obj = self.client.api.create_host_config(**host_config)
+            # 所有参数收集完毕后只创建一次主机配置
+            host_config_obj = self.api.create_host_config(**host_config) if host_config else None
             
             # 创建容器，使用低级API并传递正确格式的参数
-            container_id = self.client.api.create_container(
+            container_id = self.api.create_container(
                 image=image_name,
                 name=container_name,
                 host_config=host_config_obj,
@@ -737,8 +1484,9 @@ class DockerClient:
                 ports=exposed_ports
             )
             
-            # 获取创建的容器对象
+            # 获取创建的容器对象，放入缓存供随后的启动等操作复用
             container = self.client.containers.get(container_id['Id'])
+            self._cache_container(container)
             
             # 返回容器信息
             return {
@@ -773,16 +1521,21 @@ class DockerClient:
             if ':' in image_name:
                 image_name, tag = image_name.split(':', 1)
             
+            # 最近确认过存在的镜像无需再次查询
+            ref = f"{image_name}:{tag}"
+            if self._is_image_present(ref):
+                return True
+            
             # 检查镜像是否存在
             try:
-                self.client.images.get(f"{image_name}:{tag}")
-                self.logger.info(f"镜像 {image_name}:{tag} 已存在")
-                return True
+                self.client.images.get(ref)
+                self.logger.info(f"镜像 {ref} 已存在")
             except docker.errors.ImageNotFound:
                 # 镜像不存在，拉取镜像
-                self.logger.info(f"镜像 {image_name}:{tag} 不存在，开始拉取")
+                self.logger.info(f"镜像 {ref} 不存在，开始拉取")
                 self.pull_image(image_name, tag)
-                return True
+            self._mark_image_present(ref)
+            return True
         except Exception as e:
             self.logger.error(f"确保镜像存在时出错: {str(e)}")
             return False
@@ -798,30 +1551,96 @@ class DockerClient:
             Dict: 包含启动状态和端口映射信息
         """
         try:
-            container = self.client.containers.get(container_id)
-            container.start()
-            
-            # 等待容器完全启动
-            time.sleep(1)
-            
-            # 刷新容器信息
-            container.reload()
+            container = self.get_container(container_id)
             
-            # 获取端口映射信息
-            port_mappings = {}
-            if container.attrs['NetworkSettings']['Ports']:
-                for container_port, host_bindings in container.attrs['NetworkSettings']['Ports'].items():
-                    if host_bindings:
-                        port_mappings[container_port] = host_bindings[0]['HostPort']
+            # start()同步返回；容器已在运行时守护进程返回304且不产生start事件，
+            # 因此不等待事件，直接由下面的查询确认容器状态
+            try:
+                container.start()
+            finally:
+                self._invalidate_container(container_id)
+            
+            # 以递增间隔查询容器信息，直到容器运行且请求的端口都已绑定(总计不超过1秒)，
+            # 结果会缓存供随后的就绪检查使用
+            for delay in (0.01, 0.02, 0.05, 0.1, 0.2, 0.5):
+                attrs = self.api.inspect_container(container.id)
+                ports = (attrs.get('NetworkSettings') or {}).get('Ports') or {}
+                requested = (attrs.get('HostConfig') or {}).get('PortBindings') or {}
+                if (attrs.get('State') or {}).get('Running') and all(ports.get(spec) for spec in requested):
+                    break
+                time.sleep(delay)
+            container.attrs = attrs
+            # 刷新后的容器对象放回缓存，随后的就绪检查无需再次查询
+            self._cache_container(container, container_id)
+            endpoint = self._get_container_endpoint(container)
             
             return {
                 'status': 'running',
-                'port_mappings': port_mappings
+                'port_mappings': dict(endpoint['ports'])
             }
         except DockerException as e:
             self.logger.error(f"Failed to start container {container_id}: {str(e)}")
             raise
             
+    def _open_port_probe(self, sel: selectors.BaseSelector, ip: str, port: int,
+                         addr_cache: Optional[Dict[Tuple[str, int], Tuple]] = None):
+        """
+        发起一个非阻塞TCP连接并注册到选择器，连接完成(成功或失败)时套接字变为可写
+        
+        Args:
+            sel: 选择器
+            ip: 目标地址
+            port: 目标端口
+            addr_cache: 地址解析结果缓存，同一次就绪检查中重复探测时无需再次解析
+        """
+        try:
+            resolved = addr_cache.get((ip, port)) if addr_cache is not None else None
+            if resolved is None:
+                family, _, _, _, addr = socket.getaddrinfo(ip, port, type=socket.SOCK_STREAM)[0]
+                resolved = (family, addr)
+                if addr_cache is not None:
+                    addr_cache[(ip, port)] = resolved
+            family, addr = resolved
+            sock = socket.socket(family, socket.SOCK_STREAM)
+        except OSError as e:
+            self.logger.debug(f"无法创建到 {ip}:{port} 的探测连接: {str(e)}")
+            return
+        sock.setblocking(False)
+        sock.connect_ex(addr)
+        sel.register(sock, selectors.EVENT_WRITE, (ip, port))
+    
+    def _poll_port_probes(self, sel: selectors.BaseSelector, timeout: float) -> Optional[Tuple[str, int]]:
+        """
+        等待已注册的探测连接完成，第一个连接成功的端口胜出；
+        已完成的连接会被注销并关闭，仍在连接中的保留到下一轮。
+        连接成功的探测以RST关闭，不在本端留下TIME_WAIT状态的连接
+        
+        Args:
+            sel: 选择器
+            timeout: 最长等待时间(秒)
+            
+        Returns:
+            Optional[Tuple[str, int]]: 就绪的(地址, 端口)，没有端口就绪时返回None
+        """
+        deadline = time.monotonic() + timeout
+        while sel.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            for key, _ in sel.select(remaining):
+                sock = key.fileobj
+                error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                sel.unregister(sock)
+                if error == 0:
+                    try:
+                        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, _LINGER_RESET)
+                    except OSError:
+                        pass
+                sock.close()
+                if error == 0:
+                    return key.data
+        return None
+    
     def check_service_ready(self, container_id: str, port: int, timeout: int = 30, alt_ports: list = None) -> bool:
         """
         检查容器内服务是否就绪
@@ -843,7 +1662,7 @@ class DockerClient:
         self.logger.info(f"检查服务就绪状态，将检查以下端口: {ports_to_check}")
         
         try:
-            container = self.client.containers.get(container_id)
+            container = self.get_container(container_id)
             self.logger.info(f"检查容器 {container_id} 内服务就绪状态")
             
             # 检查容器状态
@@ -851,26 +1670,11 @@ class DockerClient:
                 self.logger.error(f"容器 {container_id} 不在运行状态，当前状态: {container.status}")
                 return False
             
-            # 获取容器IP地址
-            container_ip = None
-            try:
-                container_ip = container.attrs['NetworkSettings']['IPAddress']
-                self.logger.info(f"从IPAddress获取到容器IP: {container_ip}")
-            except (KeyError, TypeError) as e:
-                self.logger.warning(f"无法从IPAddress获取容器IP: {str(e)}")
-                
-            if not container_ip:
-                # 如果没有获取到IP地址，尝试从网络设置中获取
-                try:
-                    networks = container.attrs['NetworkSettings']['Networks']
-                    if networks:
-                        for network_name, network_config in networks.items():
-                            if 'IPAddress' in network_config and network_config['IPAddress']:
-                                container_ip = network_config['IPAddress']
-                                self.logger.info(f"从Networks[{network_name}]获取到容器IP: {container_ip}")
-                                break
-                except (KeyError, TypeError) as e:
-                    self.logger.warning(f"无法从Networks获取容器IP: {str(e)}")
+            # 获取容器IP地址和端口映射，刚启动的容器直接命中start_container留下的缓存
+            container_endpoint = self._get_container_endpoint(container)
+            container_ip = container_endpoint['ip']
+            if container_ip:
+                self.logger.info(f"获取到容器IP: {container_ip}")
             
             if not container_ip:
                 self.logger.warning(f"无法获取容器 {container_id} 的IP地址，尝试使用localhost")
@@ -878,35 +1682,63 @@ class DockerClient:
                 container_ip = 'localhost'
                 self.logger.info(f"使用localhost作为回退方案")
             
+            # 在循环外一次性确定所有探测地址: 已发布到宿主机的端口优先经回环地址探测，
+            # 不经过网桥转发，在无法直接访问容器IP的环境(如Docker Desktop)中也可用
+            endpoints = tuple(
+                ('127.0.0.1', int(container_endpoint['ports'][f"{p}/tcp"]))
+                for p in ports_to_check if container_endpoint['ports'].get(f"{p}/tcp")
+            ) + tuple((container_ip, p) for p in ports_to_check)
+            
             # 尝试连接服务
             service_ready = False
             start_time = time.time()
             
-            # 循环直到超时
-            while time.time() - start_time < timeout:
-                # 检查所有要检查的端口
-                for check_port in ports_to_check:
-                    try:
-                        self.logger.info(f"尝试连接服务: {container_ip}:{check_port}")
-                        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                        sock.settimeout(1)
-                        result = sock.connect_ex((container_ip, check_port))
-                        sock.close()
-                        
-                        if result == 0:
-                            self.logger.info(f"服务已就绪: {container_ip}:{check_port}")
+            # 订阅容器事件，容器退出时可以立即结束等待
+            event_queue = self._subscribe_events(container.id)
+            sel = selectors.DefaultSelector()
+            addr_cache: Dict[Tuple[str, int], Tuple] = {}
+            wait_interval = self.READY_POLL_MIN_INTERVAL
+            self.logger.info(f"尝试连接服务: {endpoints}")
+            try:
+                # 循环直到超时
+                while time.time() - start_time < timeout:
+                    # 为没有进行中连接的端口重新发起非阻塞连接，所有端口同时探测，任一端口就绪即返回
+                    probing = {key.data for key in sel.get_map().values()}
+                    for probe_ip, probe_port in endpoints:
+                        if (probe_ip, probe_port) not in probing:
+                            self._open_port_probe(sel, probe_ip, probe_port, addr_cache)
+                    ready_endpoint = self._poll_port_probes(sel, min(1, max(0, timeout - (time.time() - start_time))))
+                    if ready_endpoint is not None:
+                        self.logger.info(f"服务已就绪: {ready_endpoint[0]}:{ready_endpoint[1]}")
+                        return True
+                    self.logger.debug(f"服务在端口 {ports_to_check} 上尚未就绪")
+                    
+                    # 如果所有端口都未就绪，在事件队列上等待一会再尝试，等待时间从很短开始逐轮翻倍；
+                    # 配置了健康检查的容器变为healthy时立即视为就绪
+                    event = self._wait_for_event(event_queue, {'die', 'oom', 'health_status: healthy'}, timeout=wait_interval)
+                    wait_interval = min(wait_interval * 2, self.READY_POLL_MAX_INTERVAL)
+                    if event is not None:
+                        if (event.get('Action') or event.get('status')) == 'health_status: healthy':
+                            self.logger.info(f"容器 {container_id} 健康检查通过，服务已就绪")
                             return True
-                            
-                        self.logger.debug(f"服务在端口 {check_port} 上尚未就绪，错误码: {result}")
-                    except Exception as e:
-                        self.logger.debug(f"检查端口 {check_port} 时发生错误: {str(e)}")
-                
-                # 如果所有端口都未就绪，等待一会再尝试
-                time.sleep(1)
+                        self.logger.error(f"容器 {container_id} 已退出，事件: {event.get('Action') or event.get('status')}")
+                        return False
+            finally:
+                for key in list(sel.get_map().values()):
+                    key.fileobj.close()
+                sel.close()
+                self._unsubscribe_events(container.id, event_queue)
                     
-            # 获取容器日志以帮助诊断问题
+            # 获取容器日志以帮助诊断问题，流式读取并限制总字节数，避免超长日志行占用大量内存
             try:
-                logs = container.logs(tail=50).decode('utf-8')
+                chunks = []
+                total = 0
+                for chunk in container.logs(tail=50, stream=True, follow=False):
+                    chunks.append(chunk)
+                    total += len(chunk)
+                    if total >= self.DIAG_LOG_MAX_BYTES:
+                        break
+                logs = b''.join(chunks)[:self.DIAG_LOG_MAX_BYTES].decode('utf-8', 'replace')
                 self.logger.warning(f"服务未就绪，容器日志: {logs}")
             except Exception as e:
                 self.logger.error(f"获取容器日志失败: {str(e)}")
@@ -944,8 +1776,10 @@ class DockerClient:
             bool: 停止是否成功
         """
         try:
-            container = self.client.containers.get(container_id)
+            container = self.get_container(container_id)
             container.stop(timeout=timeout)
+            self._invalidate_container(container_id)
+            DockerClient._container_env_cache.pop(container.id, None)
             return True
         except DockerException as e:
             self.logger.error(f"Failed to stop container {container_id}: {str(e)}")
@@ -961,12 +1795,98 @@ class DockerClient:
         Returns:
             Container: Docker容器对象
         """
+        now = time.monotonic()
+        with self._container_cache_lock:
+            cached = self._container_cache.get(container_id)
+        if cached is not None and now - cached[0] < self.CONTAINER_CACHE_TTL:
+            return cached[1]
+        
         try:
             container = self.client.containers.get(container_id)
-            return container
         except DockerException as e:
             self.logger.error(f"获取容器失败 {container_id}: {str(e)}")
             raise
+        
+        self._cache_container(container, container_id, now=now)
+        return container
+    
+    def _cache_container(self, container, *container_ids: str, now: Optional[float] = None):
+        """
+        将已获取的容器对象放入缓存，同一流程中的后续操作可直接复用
+        
+        Args:
+            container: Docker容器对象
+            container_ids: 除完整ID外还要缓存的键(如调用方传入的短ID或名称)
+            now: 获取容器对象的时间，默认为当前时间
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._container_cache_lock:
+            for key in {container.id, *container_ids}:
+                self._container_cache[key] = (now, container)
+                self._container_cache.move_to_end(key)
+            # 超出容量时淘汰最久未更新的条目
+            while len(self._container_cache) > self.CONTAINER_CACHE_SIZE:
+                self._container_cache.popitem(last=False)
+    
+    def _invalidate_container(self, container_id: str) -> str:
+        """
+        使容器对象缓存失效，在容器状态发生变化后调用
+        
+        Args:
+            container_id: 容器ID
+            
+        Returns:
+            str: 从缓存中解析出的完整容器ID，未缓存时返回传入的ID
+        """
+        with self._container_cache_lock:
+            # 同一容器可能以完整ID和调用方传入的ID分别缓存
+            stale = self._container_cache.pop(container_id, None)
+            if stale is None:
+                # 传入的名称可能未作为键缓存过，按缓存中容器的名称查找完整ID
+                stale = next((entry for entry in self._container_cache.values() if entry[1].name == container_id), None)
+            full_id = stale[1].id if stale is not None else container_id
+            for key in [key for key, (_, cached) in self._container_cache.items() if cached.id.startswith(full_id)]:
+                del self._container_cache[key]
+            # 端点缓存以完整ID为键
+            for cached_id in [cid for cid in self._container_meta_cache if cid.startswith(full_id)]:
+                del self._container_meta_cache[cached_id]
+        return full_id
+    
+    def _get_container_endpoint(self, container) -> Dict:
+        """
+        获取容器的IP地址和端口映射，在CONTAINER_META_CACHE_TTL_NS内复用上次的结果
+        
+        Args:
+            container: Docker容器对象
+            
+        Returns:
+            Dict: {'ip': 容器IP(可能为None), 'ports': {'容器端口/协议': 主机端口}}
+        """
+        now = time.monotonic_ns()
+        with self._container_cache_lock:
+            cached = self._container_meta_cache.get(container.id)
+        if cached is not None and now - cached[0] < self.CONTAINER_META_CACHE_TTL_NS:
+            return cached[1]
+        
+        network_settings = container.attrs.get('NetworkSettings') or {}
+        # 优先使用默认网络的IPAddress，没有时取第一个有地址的网络
+        ip = network_settings.get('IPAddress')
+        if not ip:
+            for network_config in (network_settings.get('Networks') or {}).values():
+                if network_config and network_config.get('IPAddress'):
+                    ip = network_config['IPAddress']
+                    break
+        ports = {
+            container_port: host_bindings[0]['HostPort']
+            for container_port, host_bindings in (network_settings.get('Ports') or {}).items()
+            if host_bindings
+        }
+        endpoint = {'ip': ip, 'ports': ports}
+        
+        with self._container_cache_lock:
+            self._container_meta_cache[container.id] = (now, endpoint)
+        return endpoint
             
     def create_jupyter_container(
         self,
@@ -990,46 +1910,34 @@ class DockerClient:
             Dict: 创建的容器信息
         """
         try:
-            # 设置端口映射，8888是Jupyter默认端口
-            ports = {'8888/tcp': None}  # None会自动分配主机端口
-            
-            # 设置环境变量
-            environment = {
-                'JUPYTER_ENABLE_LAB': 'yes',  # 启用JupyterLab
-                'JUPYTER_TOKEN': '',          # 设置空token，无需密码
-                'JUPYTER_PASSWORD': '',       # 设置空密码
-                'JUPYTER_ALLOW_ORIGIN': '*',  # 允许跨域
-                'PYTHONPATH': '/workspace',   # 设置Python路径
-                'PYTHONUNBUFFERED': '1'      # 禁用Python输出缓冲
-            }
+            # 优先使用基于同一基础镜像ID构建的预装了Jupyter的派生镜像，返回结果中仍使用调用方请求的镜像名
+            requested_image = image_name
+            try:
+                jupyter_image = self._jupyter_image_name(self.api.inspect_image(image_name)['Id'])
+                if jupyter_image:
+                    self.api.inspect_image(jupyter_image)
+                    self.logger.info(f"使用预装Jupyter的镜像 {jupyter_image} (基础镜像 {image_name})")
+                    image_name = jupyter_image
+            except DockerException:
+                pass
             
             # 设置挂载卷
-            volumes = {}
+            volumes = None
             if workspace_path:
-                volumes[workspace_path] = {'bind': '/workspace', 'mode': 'rw'}
-            
-            # 设置重启策略和健康检查
-            restart_policy = {"Name": "unless-stopped"}
-            healthcheck = {
-                "test": ["CMD-SHELL", "curl -f http://localhost:8888/api || exit 1"],
-                "interval": 30000000000,  # 30秒
-                "timeout": 10000000000,   # 10秒
-                "retries": 3,
-                "start_period": 30000000000  # 30秒
-            }
+                volumes = {workspace_path: {'bind': '/workspace', 'mode': 'rw'}}
             
             # 创建容器
             container = self.client.containers.create(
                 image=image_name,
                 name=container_name,
-                environment=environment,
-                ports=ports,
+                environment=_JUPYTER_ENV,
+                ports=_JUPYTER_PORTS,
                 volumes=volumes,
                 cpu_count=cpu_count,
                 mem_limit=memory_limit,
                 detach=True,  # 后台运行
-                restart_policy=restart_policy,
-                healthcheck=healthcheck,
+                restart_policy=_JUPYTER_RESTART,
+                healthcheck=_JUPYTER_HEALTHCHECK,
                 tty=True,  # 分配伪终端
                 stdin_open=True,  # 保持stdin打开
                 working_dir='/workspace'  # 设置工作目录
@@ -1040,7 +1948,7 @@ class DockerClient:
                 'id': container.id,
                 'name': container.name,
                 'status': container.status,
-                'image': container.image.tags[0] if container.image.tags else container.image.id,
+                'image': requested_image,
                 'jupyter_port': 8888
             }
         except DockerException as e:
@@ -1059,26 +1967,49 @@ class DockerClient:
             bool: 删除是否成功
         """
         try:
-            container = self.client.containers.get(container_id)
-            container.remove(force=force)
+            # 直接调用低级API，省去获取容器对象的inspect请求
+            self.api.remove_container(container_id, force=force)
+            full_id = self._invalidate_container(container_id)
+            # 统计缓存以完整ID为键，按前缀清除传入短ID时对应的条目
+            for cached_id in [cid for cid in self._stats_cache if cid.startswith(full_id)]:
+                del self._stats_cache[cached_id]
+            for cached_id in [cid for cid in self._prev_cpu if cid.startswith(full_id)]:
+                del self._prev_cpu[cached_id]
+            for cached_id in [cid for cid in DockerClient._container_env_cache if cid.startswith(container_id)]:
+                DockerClient._container_env_cache.pop(cached_id, None)
             return True
         except DockerException as e:
             self.logger.error(f"Failed to remove container {container_id}: {str(e)}")
             raise
             
-    def get_container_stats(self, container_id: str) -> Dict:
+    def get_container_stats(self, container_id: str, min_interval: float = 2.0, jitter: float = 0.5) -> Dict:
         """
         获取容器的资源使用情况
 
         Args:
             container_id: 容器ID或名称
+            min_interval: 两次实际查询之间的最小间隔(秒)，间隔内返回上一次的结果；为0时每次都查询
+            jitter: 在最小间隔上叠加的随机抖动上限(秒)，避免多个容器的查询同时打到Docker守护进程
 
         Returns:
             Dict: 包含CPU和内存使用率等信息的字典
         """
         try:
-            container = self.client.containers.get(container_id)
-            stats = container.stats(stream=False)
+            # 容器对象来自短期缓存，状态直接使用State.Status(running、paused、created、exited等)；
+            # 统计缓存以完整ID为键，同一容器以短ID、完整ID或名称查询时共用一个条目
+            container = self.get_container(container_id)
+            full_id = container.id
+            
+            if min_interval > 0:
+                cached = self._stats_cache.get(full_id)
+                if cached is not None and time.monotonic() - cached[0] < min_interval + random.uniform(0, jitter):
+                    return dict(cached[1], container_id=container_id)
+            
+            # 单次读取，不等待守护进程采集第二个样本；API版本低于1.41时不支持one_shot，退回普通单次读取
+            try:
+                stats = self.api.stats(full_id, stream=False, one_shot=True)
+            except docker.errors.InvalidVersion:
+                stats = self.api.stats(full_id, stream=False)
             
             # 初始化结果字典
             result = {
@@ -1089,16 +2020,22 @@ class DockerClient:
             
             # 计算CPU使用率（添加错误处理）
             try:
-                # 确保所有必要的键存在
-                if ('cpu_stats' in stats and 'precpu_stats' in stats and
-                    'cpu_usage' in stats['cpu_stats'] and 'cpu_usage' in stats['precpu_stats'] and
-                    'total_usage' in stats['cpu_stats']['cpu_usage'] and 'total_usage' in stats['precpu_stats']['cpu_usage'] and
-                    'system_cpu_usage' in stats['cpu_stats'] and 'system_cpu_usage' in stats['precpu_stats']):
-                    
-                    cpu_delta = stats['cpu_stats']['cpu_usage']['total_usage'] - \
-                               stats['precpu_stats']['cpu_usage']['total_usage']
-                    system_delta = stats['cpu_stats']['system_cpu_usage'] - \
-                                 stats['precpu_stats']['system_cpu_usage']
+                # 缺少任一字段(如已停止的容器)时跳过计算
+                try:
+                    cpu_usage_stats, system_cpu_usage = _CPU_STATS_FIELDS(stats['cpu_stats'])
+                    total_usage = cpu_usage_stats['total_usage']
+                except (KeyError, TypeError):
+                    total_usage = system_cpu_usage = None
+                if total_usage is not None and system_cpu_usage is not None:
+                    # 与上一次采样比较；首次采样时没有缓存，使用容器启动以来的累计值
+                    prev = self._prev_cpu.get(full_id)
+                    self._prev_cpu[full_id] = (total_usage, system_cpu_usage, time.monotonic())
+                    if prev is not None:
+                        cpu_delta = total_usage - prev[0]
+                        system_delta = system_cpu_usage - prev[1]
+                    else:
+                        cpu_delta = total_usage
+                        system_delta = system_cpu_usage
                     
                     if system_delta > 0:
                         cpu_usage = (cpu_delta / system_delta) * 100.0
@@ -1108,13 +2045,11 @@ class DockerClient:
             
             # 计算内存使用率（添加错误处理）
             try:
-                if ('memory_stats' in stats and 
-                    'usage' in stats['memory_stats'] and 
-                    'limit' in stats['memory_stats']):
-                    
-                    memory_usage = stats['memory_stats']['usage']
-                    memory_limit = stats['memory_stats']['limit']
-                    
+                try:
+                    memory_usage, memory_limit = _MEMORY_STATS_FIELDS(stats['memory_stats'])
+                except (KeyError, TypeError):
+                    memory_usage = memory_limit = None
+                if memory_usage is not None and memory_limit is not None:
                     result['memory_usage'] = memory_usage
                     result['memory_limit'] = memory_limit
                     
@@ -1124,27 +2059,23 @@ class DockerClient:
             except Exception as e:
                 self.logger.warning(f"计算内存使用率失败: {str(e)}")
             
-            return result
+            self._stats_cache[full_id] = (time.monotonic(), result)
+            return dict(result)
         except DockerException as e:
             self.logger.error(f"获取容器统计信息失败 {container_id}: {str(e)}")
             raise
             
-    def _parse_base_image_from_dockerfile(self, dockerfile_content: str) -> Optional[str]:
-        """从Dockerfile内容中解析基础镜像名称和标签。"""
-        for line in dockerfile_content.splitlines():
-            line_stripped = line.strip()
-            if line_stripped.upper().startswith("FROM "):
-                parts = line_stripped.split()
-                if len(parts) > 1:
-                    # 移除可能存在的 --platform 参数
-                    base_image_name = parts[1]
-                    if base_image_name.startswith("--platform="):
-                        if len(parts) > 2:
-                            return parts[2].split(" AS")[0].strip() # parts[2] is the image name
-                        else:
-                            return None # 无效的FROM指令
-                    return base_image_name.split(" AS")[0].strip() # 移除别名
-        return None
+    def _parse_base_images_from_dockerfile(self, dockerfile_content: str) -> List[str]:
+        """从Dockerfile内容中解析所有构建阶段的基础镜像，跳过对前序阶段别名和scratch的引用。"""
+        base_images = []
+        stage_aliases = set()
+        for match in _iter_from_instructions(dockerfile_content):
+            image, alias = match.group(1), match.group(2)
+            if image.lower() not in stage_aliases and image.lower() != 'scratch' and image not in base_images:
+                base_images.append(image)
+            if alias:
+                stage_aliases.add(alias.lower())
+        return base_images
 
     def _check_image_locally(self, image_name_with_tag: str) -> bool:
         """检查指定的镜像是否存在于本地。"""
@@ -1168,11 +2099,14 @@ class DockerClient:
         image_tag: str = 'latest',
         build_args: Optional[Dict[str, str]] = None,
         python_version: Optional[str] = None,
-        is_pytorch: bool = False
+        is_pytorch: bool = False,
+        cache_ref: Optional[str] = None
     ) -> Dict:
         """
         从Dockerfile内容构建Docker镜像
         
+        优先使用BuildKit(docker buildx)构建，配置了registry缓存时复用其中的层，buildx不可用或构建失败时回退到docker-py构建
+        
         Args:
             dockerfile_content: Dockerfile内容
             image_name: 镜像名称
@@ -1180,6 +2114,7 @@ class DockerClient:
             build_args: 构建参数
             python_version: 预期的Python版本，用于验证构建后的镜像
             is_pytorch: 是否是PyTorch镜像
+            cache_ref: BuildKit registry缓存引用，默认读取环境变量DOCKER_BUILD_CACHE_REF，未配置时不使用registry缓存
             
         Returns:
             Dict: 构建的镜像信息
@@ -1190,7 +2125,11 @@ class DockerClient:
             # 在Dockerfile开头添加镜像源配置以加速构建
             if not is_pytorch or "pytorch" not in image_name.lower():
                 # 对于PyTorch官方镜像，不添加中国镜像源配置，因为它们已经包含了所需依赖
-                dockerfile_content = self._add_china_mirrors(dockerfile_content)
+                dockerfile_content = self._add_china_mirrors_cached(dockerfile_content)
+            
+            # 显式开启时在最终镜像中预装Jupyter，避免每次启动容器时在线安装
+            if os.environ.get("DOCKER_PREINSTALL_JUPYTER", "0") == "1":
+                dockerfile_content = dockerfile_content.rstrip('\n') + '\n' + _JUPYTER_LAYER
             
             # 检查是否已有同名镜像 (这部分逻辑是检查最终要构建的镜像，而非基础镜像)
             full_target_image_name = f"{image_name}:{image_tag}"
@@ -1218,17 +2157,35 @@ class DockerClient:
                 self.logger.error(f"检查目标镜像 {full_target_image_name} 时发生错误: {e}, 将尝试构建。")
 
 
-            f = io.BytesIO(dockerfile_content.encode('utf-8'))
+            import io
+            # 含COPY/ADD的Dockerfile直接以内存tar作为构建上下文上传，重试时seek(0)复用同一份数据
+            uses_context = _CONTEXT_COPY_RE.search(dockerfile_content) is not None
+            if uses_context:
+                f = io.BytesIO(self._build_tar({'Dockerfile': dockerfile_content.encode('utf-8')}))
+            else:
+                f = io.BytesIO(dockerfile_content.encode('utf-8'))
             self.logger.info(f"准备从Dockerfile构建镜像 {full_target_image_name}")
             
             build_timeout = 900 
-            if not build_args:
-                build_args = {}
-            
-            build_args.update({
+            build_args = {
+                **(build_args or {}),
                 'PIP_INDEX_URL': 'https://mirrors.tuna.tsinghua.edu.cn/pypi/web/simple',
-                'PIP_TRUSTED_HOST': 'mirrors.tuna.tsinghua.edu.cn'
-            })
+                'PIP_TRUSTED_HOST': 'mirrors.tuna.tsinghua.edu.cn',
+                # 让BuildKit在镜像中内嵌层缓存元数据，之后可直接用该镜像作为--cache-from来源
+                'BUILDKIT_INLINE_CACHE': '1'
+            }
+            
+            # 镜像位于配置的私有仓库(DOCKER_BUILD_REGISTRY)中时，先拉取之前推送过的同名镜像作为层缓存来源；
+            # 其余镜像名只在本地存在，拉取会访问Docker Hub，甚至拿到同名的公共镜像当作缓存，因此只使用本地镜像
+            cache_registry = os.environ.get('DOCKER_BUILD_REGISTRY', '').rstrip('/')
+            if cache_registry and image_name.startswith(cache_registry + '/'):
+                try:
+                    self.client.images.pull(image_name, tag=image_tag)
+                    self.logger.info(f"已拉取 {full_target_image_name} 作为构建缓存来源")
+                except (ImageNotFound, APIError) as e:
+                    self.logger.info(f"仓库中没有可用作缓存的 {full_target_image_name}: {str(e)}")
+                except Exception as e:
+                    self.logger.warning(f"拉取缓存镜像 {full_target_image_name} 失败: {str(e)}")
             
             # ... (is_pytorch_cuda 和 PyTorch CPU 版本检查和Dockerfile修改逻辑保持不变) ...
             is_pytorch_cuda = False # 保留原有逻辑，这里只是为了让代码片段完整
@@ -1241,17 +2198,55 @@ class DockerClient:
 
 
             # 解析基础镜像并决定 pull 策略
-            base_image_from_dockerfile = self._parse_base_image_from_dockerfile(dockerfile_content)
+            # 多阶段构建的每个基础镜像并发检查，全部在本地存在时才不拉取
+            base_images_from_dockerfile = self._parse_base_images_from_dockerfile(dockerfile_content)
+            base_image_from_dockerfile = ', '.join(base_images_from_dockerfile)
             should_pull_base_image = True # 默认为True，即如果本地没有基础镜像则尝试拉取
-            if base_image_from_dockerfile:
-                if self._check_image_locally(base_image_from_dockerfile):
+            if base_images_from_dockerfile:
+                local_checks = [self._io_pool.submit(self._check_image_locally, img) for img in base_images_from_dockerfile]
+                if all(future.result() for future in local_checks):
                     should_pull_base_image = False # 基础镜像本地存在，构建时不需要拉取
                     self.logger.info(f"将使用本地基础镜像 {base_image_from_dockerfile} 进行构建 (pull=False)。")
                 else:
-                    self.logger.info(f"本地不存在基础镜像 {base_image_from_dockerfile}，构建时将尝试拉取 (pull=True)。")
+                    self.logger.info(f"本地不存在基础镜像 {base_image_from_dockerfile} 中的部分镜像，构建时将尝试拉取 (pull=True)。")
             else:
                 self.logger.warning("无法从Dockerfile中解析基础镜像名称，将使用默认的pull策略 (pull=True)。")
 
+            # 优先使用BuildKit构建，只有显式配置了registry缓存引用时才导入/导出层缓存，
+            # 本地镜像名对应的是Docker Hub上的仓库，向其推送缓存总会被拒绝
+            if not cache_ref:
+                cache_ref = os.environ.get('DOCKER_BUILD_CACHE_REF') or None
+            buildx_result = self._build_with_buildx(
+                dockerfile_content,
+                full_target_image_name,
+                build_args,
+                cache_ref,
+                pull=should_pull_base_image,
+                timeout=build_timeout * 2 if is_pytorch_cuda else build_timeout,
+                platform_name="linux/amd64" if is_pytorch_cuda else None
+            )
+            if buildx_result is not None:
+                image, log_output = buildx_result
+                self.logger.info(f"镜像 {full_target_image_name} 通过BuildKit构建成功。ID: {image.id}")
+                
+                actual_python_version = None
+                if python_version:
+                    actual_python_version = self._verify_python_version_in_image(image.id)
+                    if actual_python_version:
+                        self.logger.info(f"构建后的镜像 {full_target_image_name} 中的Python版本: {actual_python_version}")
+                    else:
+                        self.logger.warning(f"无法在构建后的镜像 {full_target_image_name} 中验证Python版本。")
+                
+                return {
+                    'id': image.id,
+                    'tags': image.tags,
+                    'size': image.attrs['Size'],
+                    'created': image.attrs['Created'],
+                    'source': 'build',
+                    'logs': log_output,
+                    'actual_python_version': actual_python_version
+                }
+
             # 尝试构建，设置超时时间和构建参数
             max_retries = 3
             retry_count = 0
@@ -1262,43 +2257,30 @@ class DockerClient:
                     self.logger.info(f"开始构建尝试 {retry_count + 1}/{max_retries} for {full_target_image_name}. Pull base image: {should_pull_base_image}")
                     current_build_args = build_args.copy() # 确保每次重试都用干净的build_args
 
+                    build_kwargs = {
+                        'fileobj': f, # fileobj 需要在循环外部，或者每次重置 seek(0)
+                        'tag': full_target_image_name,
+                        'rm': True,
+                        'pull': should_pull_base_image,
+                        'timeout': build_timeout,
+                        'buildargs': current_build_args,
+                        'nocache': False,
+                        'network_mode': "host",
+                        'cache_from': [full_target_image_name],
+                        'custom_context': uses_context,
+                        'decode': True
+                    }
                     # 对于PyTorch+CUDA镜像，使用特殊的构建配置
                     if is_pytorch_cuda:
                         self.logger.info("使用PyTorch+CUDA专用构建配置")
-                        image, logs = self.client.images.build(
-                            fileobj=f, # fileobj 需要在循环外部，或者每次重置 seek(0)
-                            tag=full_target_image_name,
-                            rm=True,
-                            pull=should_pull_base_image, # MODIFIED
-                            timeout=build_timeout * 2,
-                            buildargs=current_build_args,
-                            nocache=False,
-                            network_mode="host",
-                            platform="linux/amd64"
-                        )
-                    else:
-                        image, logs = self.client.images.build(
-                            fileobj=f, # fileobj 需要在循环外部，或者每次重置 seek(0)
-                            tag=full_target_image_name,
-                            rm=True,
-                            pull=should_pull_base_image,  # MODIFIED
-                            timeout=build_timeout,
-                            buildargs=current_build_args,
-                            nocache=False, 
-                            network_mode="host"
-                        )
+                        build_kwargs.update(timeout=build_timeout * 2, platform="linux/amd64")
                     
-                    # 构建成功，记录日志并退出循环
-                    log_output = []
-                    for chunk in logs:
-                        if 'stream' in chunk:
-                            log_output.append(chunk['stream'].strip())
-                        elif 'errorDetail' in chunk:
-                            log_output.append(f"ERROR: {chunk['errorDetail']['message']}")
-                            self.logger.error(f"构建错误详情: {chunk['errorDetail']['message']}")
+                    # 使用低级API流式读取构建输出，遇到错误立即终止
+                    image_id, log_output = self._consume_build_stream(self.api.build(**build_kwargs))
+                    image = self.client.images.get(image_id)
                     
                     self.logger.info(f"镜像 {full_target_image_name} 构建成功。ID: {image.id}")
-                    self.logger.debug(f"构建日志 for {full_target_image_name}:\\n{''.join(log_output)}")
+                    self.logger.debug("构建日志 for %s:\n%s", full_target_image_name, "\n".join(log_output))
 
                     # ... (后续的Python版本验证等逻辑保持不变) ...
                     actual_python_version = None
@@ -1327,8 +2309,13 @@ class DockerClient:
                     self.logger.warning(f"构建 {full_target_image_name} 失败 (尝试 {retry_count}/{max_retries}): {error_message}")
                     
                     f.seek(0) # 重置fileobj的指针，以便下次读取
+                    
+                    # 构建上下文中没有COPY/ADD需要的文件，重试结果不会不同
+                    if uses_context and any(err_keyword in error_message for err_keyword in _CONTEXT_MISSING_ERRORS):
+                        self.logger.error(f"构建 {full_target_image_name} 失败: COPY/ADD引用的文件不在构建上下文中，不再重试")
+                        raise BuildError(f"构建镜像 {full_target_image_name} 失败: {error_message}", [str(e)]) from e
 
-                    if any(err_keyword in error_message for err_keyword in ["tls handshake timeout", "connection refused", "network", "timeout", "i/o timeout", "context deadline exceeded", "operation timed out", "temporary failure in name resolution", "name or service not known", "could not resolve host"]):
+                    if _BUILD_NET_ERR_RE.search(error_message):
                         self.logger.warning(f"检测到网络相关错误，将在 {3 * retry_count} 秒后重试...")
                         time.sleep(3 * retry_count) 
                         # 在网络错误时，下次重试强制尝试拉取基础镜像（如果之前是False的话）
@@ -1353,32 +2340,17 @@ class DockerClient:
                         continue
                     else: # 所有重试次数用尽
                         self.logger.error(f"经过{max_retries}次尝试，构建镜像 {full_target_image_name} 仍然失败。最后错误: {error_message}")
+                        # 直接使用最后一次尝试中捕获的构建输出，不再为获取日志重新构建一次
                         detailed_error_log = [str(last_build_exception)]
-                        try: # 尝试获取详细的构建日志
-                            log_stream_for_error = self.client.api.build(
-                                fileobj=f, # 确保 f 在这里仍然可用且指向文件开头
-                                tag=full_target_image_name, # 用一个临时tag或不tag来获取日志
-                                rm=True, 
-                                pull=should_pull_base_image, 
-                                buildargs=build_args,
-                                quiet=False, # 需要日志输出
-                                stream=True, # 获取流式日志
-                                decode=True
-                            )
-                            for chunk in log_stream_for_error:
-                                if 'stream' in chunk:
-                                    detailed_error_log.append(chunk['stream'])
-                                elif 'error' in chunk:
-                                    detailed_error_log.append(chunk['error'])
-                        except Exception as log_err:
-                            detailed_error_log.append(f"(获取详细构建日志失败: {log_err})")
+                        detailed_error_log.extend(getattr(last_build_exception, 'build_log', None) or [])
+                        log_text = "\n".join(detailed_error_log)
                         
-                        raise BuildError(f"构建镜像 {full_target_image_name} 失败: {error_message}. 构建日志: {''.join(detailed_error_log)}", logs=detailed_error_log) from last_build_exception
+                        raise BuildError(f"构建镜像 {full_target_image_name} 失败: {error_message}. 构建日志: {log_text}", detailed_error_log) from last_build_exception
 
             # 如果循环结束仍未成功（理论上应该在循环内返回或抛出异常）
             if last_build_exception:
                  self.logger.error(f"构建镜像 {full_target_image_name} 最终失败。")
-                 raise BuildError(f"构建镜像 {full_target_image_name} 失败: {str(last_build_exception)}", logs=[]) from last_build_exception
+                 raise BuildError(f"构建镜像 {full_target_image_name} 失败: {str(last_build_exception)}", []) from last_build_exception
             
             # 这部分理论上不会到达，因为成功会return，失败会raise
             self.logger.error(f"构建镜像 {full_target_image_name} 逻辑异常结束。") # 添加日志
@@ -1389,9 +2361,208 @@ class DockerClient:
             raise
         except Exception as e:
             self.logger.error(f"构建镜像时发生未知错误 {image_name}:{image_tag}: {str(e)}")
+            import traceback
             self.logger.error(traceback.format_exc()) # 打印完整的堆栈跟踪
             raise
 
+    def _consume_build_stream(self, stream) -> Tuple[str, List[str]]:
+        """
+        逐条读取低级API的构建输出，提取镜像ID
+        
+        只有在DEBUG日志级别下才累积完整构建日志，其余情况下返回最近BUILD_LOG_TAIL_LINES条输出，
+        遇到错误时立即抛出附带这些输出的BuildError
+        
+        Args:
+            stream: client.api.build(decode=True)返回的生成器
+            
+        Returns:
+            Tuple[str, List[str]]: 镜像ID和构建日志(DEBUG级别下为完整日志，否则为末尾部分)
+            
+        Raises:
+            BuildError: 构建输出中包含错误或未能获取镜像ID
+        """
+        import io
+        # 输出本身带换行，原样写入缓冲区，结束时一次性拆分为行
+        log_buf = io.StringIO() if self.logger.isEnabledFor(logging.DEBUG) else None
+        log_tail = deque(maxlen=self.BUILD_LOG_TAIL_LINES)
+        image_id = None
+        for chunk in stream:
+            if 'errorDetail' in chunk or 'error' in chunk:
+                message = chunk.get('errorDetail', {}).get('message') or chunk.get('error')
+                self.logger.error(f"构建错误详情: {message}")
+                log_output = [text.rstrip('\n') for text in log_tail]
+                log_output.append(f"ERROR: {message}")
+                raise BuildError(message, log_output)
+            if 'aux' in chunk and 'ID' in chunk['aux']:
+                image_id = chunk['aux']['ID']
+            text = chunk.get('stream')
+            if text:
+                log_tail.append(text)
+                if log_buf is not None:
+                    log_buf.write(text)
+                # 旧版本守护进程不返回aux，从输出中解析镜像ID
+                if image_id is None and text.startswith('Successfully built '):
+                    image_id = text[len('Successfully built '):].strip()
+        
+        if image_id is None:
+            raise BuildError("构建完成但未能获取镜像ID", [text.rstrip('\n') for text in log_tail])
+        if log_buf is not None:
+            return image_id, log_buf.getvalue().splitlines()
+        return image_id, [text.rstrip('\n') for text in log_tail]
+
+    def _is_buildx_available(self) -> bool:
+        """检查docker buildx插件是否可用，结果缓存在实例上。"""
+        if self._buildx_available is None:
+            try:
+                result = subprocess.run(['docker', 'buildx', 'version'], capture_output=True, check=False)
+                self._buildx_available = result.returncode == 0
+            except Exception:
+                self._buildx_available = False
+            self.logger.info(f"docker buildx可用: {self._buildx_available}")
+        return self._buildx_available
+
+    def _build_with_buildx(
+        self,
+        dockerfile_content: str,
+        full_image_name: str,
+        build_args: Dict[str, str],
+        cache_ref: Optional[str],
+        pull: bool = True,
+        timeout: int = 900,
+        platform_name: Optional[str] = None
+    ) -> Optional[Tuple[Any, List[str]]]:
+        """
+        使用BuildKit(docker buildx)构建镜像，配置了registry缓存引用时通过它复用层
+        
+        Args:
+            dockerfile_content: Dockerfile内容
+            full_image_name: 目标镜像名称(含标签)
+            build_args: 构建参数
+            cache_ref: registry缓存引用，为None时不导入/导出缓存
+            pull: 是否拉取基础镜像
+            timeout: 构建超时时间(秒)
+            platform_name: 目标平台，例如linux/amd64
+            
+        Returns:
+            Optional[Tuple[Image, List[str]]]: 构建出的镜像和构建日志；buildx不可用或构建失败时返回None
+        """
+        if not self._is_buildx_available():
+            return None
+        
+        cmd = [
+            'docker', 'buildx', 'build', '--load', '--progress=plain',
+            '-t', full_image_name,
+        ]
+        if cache_ref:
+            # 缓存导出失败(无推送权限、驱动不支持等)不应让已完成的构建失败
+            cmd.extend([
+                '--cache-from', f"type=registry,ref={cache_ref}",
+                '--cache-to', f"type=registry,ref={cache_ref},mode=max,ignore-error=true",
+            ])
+        for key, value in build_args.items():
+            cmd.extend(['--build-arg', f"{key}={value}"])
+        if pull:
+            cmd.append('--pull')
+        if platform_name:
+            cmd.extend(['--platform', platform_name])
+        cmd.extend(['-f', 'Dockerfile', '.'])
+        
+        env = {**os.environ, 'DOCKER_BUILDKIT': '1'}
+        log_output = []
+        import tempfile
+        try:
+            with tempfile.TemporaryDirectory() as build_dir:
+                with open(os.path.join(build_dir, 'Dockerfile'), 'w', encoding='utf-8') as f:
+                    f.write(self._inject_cache_mounts(dockerfile_content))
+                
+                self.logger.info(f"使用BuildKit构建镜像 {full_image_name}，缓存: {cache_ref or '无'}")
+                process = subprocess.Popen(
+                    cmd, cwd=build_dir, env=env,
+                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                    text=True, encoding='utf-8', errors='replace'
+                )
+                # 由看门狗计时器强制超时，构建长时间没有输出时也能终止
+                timed_out = threading.Event()
+                
+                def kill_on_timeout():
+                    timed_out.set()
+                    process.kill()
+                
+                watchdog = threading.Timer(timeout, kill_on_timeout)
+                watchdog.daemon = True
+                watchdog.start()
+                try:
+                    for line in process.stdout:
+                        log_output.append(line.rstrip())
+                    returncode = process.wait()
+                finally:
+                    watchdog.cancel()
+            
+            if timed_out.is_set():
+                self.logger.warning(f"BuildKit构建 {full_image_name} 超过 {timeout} 秒被终止，回退到常规构建")
+                return None
+            if returncode != 0:
+                self.logger.warning(f"BuildKit构建 {full_image_name} 失败(退出码 {returncode})，回退到常规构建: {' '.join(log_output[-5:])}")
+                return None
+            
+            return self.client.images.get(full_image_name), log_output
+        except Exception as e:
+            self.logger.warning(f"BuildKit构建 {full_image_name} 时出错，回退到常规构建: {str(e)}")
+            return None
+
+    def _inject_cache_mounts(self, dockerfile_content: str) -> str:
+        """
+        为pip/apt相关的RUN指令注入BuildKit缓存挂载，使下载的wheel和deb包在多次构建之间复用
+        
+        只能用于BuildKit构建，传统构建器不支持RUN --mount
+        
+        Args:
+            dockerfile_content: 原始Dockerfile内容
+            
+        Returns:
+            str: 注入缓存挂载后的Dockerfile内容
+        """
+        # 内置前端已支持RUN --mount，不添加# syntax指令，避免每次构建从Docker Hub拉取前端镜像
+        lines = dockerfile_content.splitlines()
+        result_lines = []
+        
+        i = 0
+        while i < len(lines):
+            # 收集一条完整指令（包括续行）
+            start = i
+            while i < len(lines) - 1 and lines[i].rstrip().endswith('\\'):
+                i += 1
+            instruction = lines[start:i + 1]
+            i += 1
+            
+            match = _RUN_RE.match(instruction[0])
+            if not match:
+                result_lines.extend(instruction)
+                continue
+            
+            text = '\n'.join(instruction)
+            prefix = match.group(1)
+            # exec形式(JSON数组)的RUN不经过shell，无法在命令前插入删除docker-clean的语句
+            shell_form = not instruction[0][len(prefix):].lstrip().startswith('[')
+            mounts = []
+            keep_apt_cache = ''
+
+            if 'pip install' in text or 'pip3 install' in text:
+                mounts.append(_PIP_CACHE_MOUNT)
+                # --no-cache-dir会让pip绕过缓存挂载
+                instruction = [_PIP_NO_CACHE_RE.sub('', line) for line in instruction]
+            if 'apt-get' in text and shell_form:
+                mounts.append(_APT_CACHE_MOUNTS)
+                keep_apt_cache = _APT_KEEP_CACHE
+                # 列表目录已挂载为缓存，无需清理
+                instruction = [_APT_LISTS_CLEANUP_RE.sub('true', line) for line in instruction]
+            
+            if mounts:
+                instruction[0] = f"{prefix}{' '.join(mounts)} {keep_apt_cache}{instruction[0][len(prefix):]}"
+            result_lines.extend(instruction)
+        
+        return '\n'.join(result_lines)
+
     def _add_version_verification(self, dockerfile_content, expected_version):
         """
         在Dockerfile中添加Python版本验证步骤
@@ -1421,43 +2592,19 @@ RUN python --version && \\
                 self.logger.warning("Dockerfile内容为空，无法添加版本验证")
                 return ""
                 
-            # 分割Dockerfile为行
-            dockerfile_lines = dockerfile_content.splitlines()
-            
-            # 检查是否有FROM指令
-            has_from = any(line.strip().startswith("FROM ") for line in dockerfile_lines)
-            if not has_from:
+            # 找到最后一个FROM指令（最终镜像所在的阶段）
+            last_from = None
+            for last_from in _iter_from_instructions(dockerfile_content):
+                pass
+            if last_from is None:
                 self.logger.warning("Dockerfile中没有找到FROM指令，将在开头添加验证命令")
                 return verification_command + "\n" + dockerfile_content
             
-            # 处理多阶段构建的情况
-            result_lines = []
-            stage_start_indices = []
-            
-            # 找出所有的FROM指令位置
-            for i, line in enumerate(dockerfile_lines):
-                if line.strip().startswith("FROM "):
-                    stage_start_indices.append(i)
-            
-            # 如果没有找到任何FROM指令，直接在开头添加
-            if not stage_start_indices:
-                return verification_command + "\n" + dockerfile_content
-                
-            # 处理每个构建阶段
-            for i, start_idx in enumerate(stage_start_indices):
-                # 添加FROM指令
-                result_lines.append(dockerfile_lines[start_idx])
-                
-                # 只在最后一个FROM后添加验证命令（最终镜像）
-                if i == len(stage_start_indices) - 1:
-                    result_lines.append(verification_command)
-                
-                # 添加当前阶段的剩余指令直到下一个阶段（如果有）
-                next_idx = stage_start_indices[i+1] if i+1 < len(stage_start_indices) else len(dockerfile_lines)
-                for j in range(start_idx + 1, next_idx):
-                    result_lines.append(dockerfile_lines[j])
-            
-            return "\n".join(result_lines)
+            # 在最后一个FROM所在行之后插入验证命令
+            eol = dockerfile_content.find("\n", last_from.end())
+            if eol == -1:
+                return dockerfile_content + "\n" + verification_command
+            return dockerfile_content[:eol + 1] + verification_command + dockerfile_content[eol + 1:]
             
         except Exception as e:
             self.logger.error(f"在Dockerfile中添加版本验证时出错: {str(e)}")
@@ -1474,35 +2621,42 @@ RUN python --version && \\
         Returns:
             Optional[str]: 检测到的Python版本，如果检测失败则返回None
         """
+        # 镜像ID基于内容寻址，同一ID对应的Python版本永远不变
+        cacheable = image_id.startswith('sha256:')
+        if cacheable:
+            with DockerClient._py_ver_cache_lock:
+                if image_id in DockerClient._py_ver_cache:
+                    DockerClient._py_ver_cache.move_to_end(image_id)
+                    return DockerClient._py_ver_cache[image_id]
+        
         try:
-            # 创建临时容器来运行命令
-            container = self.client.containers.create(
+            # 始终在全新的临时容器中检测，其他用户运行中的容器可能修改了PATH或安装了别的解释器；
+            # 一次run调用完成创建、启动、等待、读取输出和删除临时容器；
+            # 检测无需网络，禁用网络可省去网络初始化
+            raw = self.client.containers.run(
                 image_id,
-                command="python -c 'import platform; print(platform.python_version())'",
-                detach=False
+                command=["python", "-c", "import platform; print(platform.python_version())"],
+                remove=True,
+                stdout=True,
+                stderr=False,
+                network_disabled=True,
+                mem_limit='128m'
             )
-            
-            # 启动容器
-            container.start()
-            
-            # 等待容器完成
-            exit_code = container.wait()['StatusCode']
-            
-            if exit_code == 0:
-                # 获取输出
-                logs = container.logs().decode('utf-8').strip()
-                self.logger.info(f"检测到镜像中的Python版本: {logs}")
-                
-                # 清理容器
-                container.remove()
-                
-                return logs
-            else:
-                self.logger.warning(f"Python版本检查失败，退出码: {exit_code}")
-                # 清理容器
-                container.remove()
-                return None
-                
+            # 版本号在stdout的最后一行
+            lines = raw.decode('utf-8', 'replace').strip().splitlines()
+            logs = lines[-1].strip() if lines else ''
+            self.logger.info(f"检测到镜像中的Python版本: {logs}")
+            
+            if cacheable and logs:
+                with DockerClient._py_ver_cache_lock:
+                    DockerClient._py_ver_cache[image_id] = logs
+                    if len(DockerClient._py_ver_cache) > self.PY_VER_CACHE_SIZE:
+                        DockerClient._py_ver_cache.popitem(last=False)
+            
+            return logs
+        except docker.errors.ContainerError as e:
+            self.logger.warning(f"Python版本检查失败，退出码: {e.exit_status}")
+            return None
         except Exception as e:
             self.logger.error(f"验证镜像中的Python版本时出错: {str(e)}")
             return None
@@ -1533,17 +2687,20 @@ RUN python --version && \\
                 self.logger.warning("Dockerfile没有内容")
                 return ""
                 
-            simplified_lines = []
-            
-            # 指示下一行是否需要被保留
-            keep_next_line = True
-            
-            # 检查基本结构
-            has_from = any(line.strip().startswith('FROM ') for line in lines)
-            if not has_from:
-                self.logger.warning("Dockerfile中没有FROM指令，可能不是有效的Dockerfile")
-                # 尝试添加一个基本的FROM指令
-                simplified_lines.append("FROM python:3.9-slim")
+            import io
+            # 输出直接写入缓冲区，同时记录非注释行数和是否已有PyTorch验证，省去结束时的再次扫描
+            buf = io.StringIO()
+            non_comment = 0
+            has_torch_check = False
+            
+            def emit(line):
+                nonlocal non_comment, has_torch_check
+                buf.write(line)
+                buf.write('\n')
+                if not line.startswith('#'):
+                    non_comment += 1
+                if 'import torch' in line:
+                    has_torch_check = True
             
             # 检测是否为PyTorch相关Dockerfile
             pytorch_detected = False
@@ -1551,25 +2708,29 @@ RUN python --version && \\
             pytorch_version = None
             cuda_version = None
             
-            # 尝试提取PyTorch和CUDA版本信息
-            for line in lines:
+            # 一次遍历同时找出所有FROM指令位置并提取PyTorch和CUDA版本信息
+            stage_start_indices = []
+            for i, line in enumerate(lines):
+                if line.strip().startswith('FROM '):
+                    stage_start_indices.append(i)
+                
                 line_lower = line.lower()
                 if 'torch==' in line_lower:
                     pytorch_detected = True
-                    match = re.search(r'torch==(\d+\.\d+\.\d+)', line)
+                    match = _DF_TORCH_VER_RE.search(line)
                     if match:
                         pytorch_version = match.group(1)
                         self.logger.info(f"简化版检测到PyTorch版本: {pytorch_version}")
                 
                 if 'nvidia' in line_lower or 'cuda' in line_lower:
                     cuda_detected = True
-                    match = re.search(r'cuda:?(\d+\.\d+)', line_lower)
+                    match = _DF_CUDA_VER_RE.search(line_lower)
                     if match:
                         cuda_version = match.group(1)
                         self.logger.info(f"简化版检测到CUDA版本: {cuda_version}")
                 
                 if 'cu' in line_lower and ('--index-url' in line_lower or 'index-url' in line_lower):
-                    match = re.search(r'cu(\d+)', line_lower)
+                    match = _DF_CU_INDEX_RE.search(line_lower)
                     if match:
                         cuda_version_no_dots = match.group(1)
                         # 转换为标准格式 (例如: 116 -> 11.6)
@@ -1579,48 +2740,41 @@ RUN python --version && \\
                             cuda_version = cuda_version_no_dots[0] + '.' + cuda_version_no_dots[1]
                         self.logger.info(f"简化版从index-url检测到CUDA版本: {cuda_version}")
             
-            # 构建多阶段构建的简化Dockerfile
-            stage_counter = 0
-            current_stage = 0
-            stage_start_indices = []
-            
-            # 先找出所有的FROM指令位置
-            for i, line in enumerate(lines):
-                if line.strip().startswith('FROM '):
-                    stage_start_indices.append(i)
-                    
-            # 如果没有FROM指令，假设整个文件是一个阶段
-            if not stage_start_indices:
+            # 检查基本结构
+            has_from = bool(stage_start_indices)
+            if not has_from:
+                self.logger.warning("Dockerfile中没有FROM指令，可能不是有效的Dockerfile")
+                # 尝试添加一个基本的FROM指令
+                emit("FROM python:3.9-slim")
+                # 没有FROM指令时，假设整个文件是一个阶段
                 stage_start_indices = [0]
                 
-            # 处理每个构建阶段
+            # 构建多阶段构建的简化Dockerfile，处理每个构建阶段
             for i, start_idx in enumerate(stage_start_indices):
-                current_stage = i
-                
                 # 确定当前阶段的结束位置
                 next_idx = stage_start_indices[i+1] if i+1 < len(stage_start_indices) else len(lines)
                 
                 # 如果是FROM指令，直接添加
-                if start_idx < len(lines) and lines[start_idx].strip().startswith('FROM '):
-                    simplified_lines.append(lines[start_idx])
+                if has_from:
+                    emit(lines[start_idx])
                 elif i == 0:  # 如果第一个阶段不是FROM指令
                     # 根据检测到的环境选择合适的基础镜像
                     if pytorch_detected and pytorch_version:
                         if cuda_detected and cuda_version:
-                            simplified_lines.append(f"FROM pytorch/pytorch:{pytorch_version}-cuda{cuda_version}-cudnn8-runtime  # 自动选择的PyTorch CUDA基础镜像")
+                            emit(f"FROM pytorch/pytorch:{pytorch_version}-cuda{cuda_version}-cudnn8-runtime  # 自动选择的PyTorch CUDA基础镜像")
                             self.logger.info(f"简化版为PyTorch CUDA环境选择基础镜像: {pytorch_version}-cuda{cuda_version}")
                         else:
-                            simplified_lines.append(f"FROM pytorch/pytorch:{pytorch_version}-cpu  # 自动选择的PyTorch CPU基础镜像")
+                            emit(f"FROM pytorch/pytorch:{pytorch_version}-cpu  # 自动选择的PyTorch CPU基础镜像")
                             self.logger.info(f"简化版为PyTorch CPU环境选择基础镜像: {pytorch_version}")
                     elif cuda_detected and cuda_version:
-                        simplified_lines.append(f"FROM nvidia/cuda:{cuda_version}-base-ubuntu20.04  # 自动选择的CUDA基础镜像")
+                        emit(f"FROM nvidia/cuda:{cuda_version}-base-ubuntu20.04  # 自动选择的CUDA基础镜像")
                         self.logger.info(f"简化版为CUDA环境选择基础镜像: {cuda_version}")
                     else:
-                        simplified_lines.append("FROM python:3.9-slim")
+                        emit("FROM python:3.9-slim")
                 
                 # 添加中国镜像源配置（对于简化版Dockerfile尤为重要）
                 if i == 0:  # 只在第一阶段添加
-                    simplified_lines.append("""
+                    emit("""
 # 配置PIP镜像源
 RUN mkdir -p /root/.pip && \\
     echo '[global]' > /root/.pip/pip.conf && \\
@@ -1628,110 +2782,42 @@ RUN mkdir -p /root/.pip && \\
     echo 'trusted-host = mirrors.tuna.tsinghua.edu.cn' >> /root/.pip/pip.conf
 """)
                 
-                # 处理当前阶段的其他指令
-                keep_next_line = True
-                for j in range(start_idx + 1, next_idx):
-                    line = lines[j]
-                    line_stripped = line.strip()
-                    
-                    # 始终保留FROM指令（虽然这不应该在这个内部循环中出现）
-                    if line_stripped.startswith('FROM '):
-                        simplified_lines.append(line)
-                        keep_next_line = True
-                        continue
-                        
-                    # 保留WORKDIR指令
-                    if line_stripped.startswith('WORKDIR '):
-                        simplified_lines.append(line)
-                        continue
-                        
-                    # 保留ENV指令
-                    if line_stripped.startswith('ENV '):
-                        simplified_lines.append(line)
-                        continue
-                        
-                    # 保留LABEL指令
-                    if line_stripped.startswith('LABEL '):
-                        simplified_lines.append(line)
-                        continue
-                        
-                    # 保留ARG指令，除了与网络相关的
-                    if line_stripped.startswith('ARG '):
-                        if 'proxy' in line_stripped.lower() or 'mirror' in line_stripped.lower():
-                            simplified_lines.append(f'# 已移除(可能与网络相关): {line}')
-                        else:
-                            simplified_lines.append(line)
-                        continue
-                        
-                    # 保留CMD和ENTRYPOINT指令
-                    if line_stripped.startswith('CMD ') or line_stripped.startswith('ENTRYPOINT '):
-                        simplified_lines.append(line)
-                        continue
-                        
-                    # 保留COPY和ADD指令
-                    if line_stripped.startswith('COPY ') or line_stripped.startswith('ADD '):
-                        simplified_lines.append(line)
-                        continue
-                        
-                    # 特殊处理PyTorch安装命令
-                    if line_stripped.startswith('RUN ') and ('torch' in line_stripped.lower() or 'pytorch' in line_stripped.lower()):
-                        # 如果是简单的PyTorch验证命令，保留
-                        if 'import torch' in line_stripped.lower() and ('print' in line_stripped.lower() or 'version' in line_stripped.lower()):
-                            simplified_lines.append(line)
-                            continue
-                        # 否则注释掉PyTorch安装命令，因为我们使用预构建的PyTorch镜像
-                        simplified_lines.append(f'# 已移除(使用预构建PyTorch镜像替代): {line}')
-                        continue
-                        
-                    # 注释掉RUN pip install命令，因为它们需要网络
-                    if line_stripped.startswith('RUN pip') or 'pip install' in line_stripped:
-                        simplified_lines.append(f'# 已移除(需要网络): {line}')
-                        continue
+                # 处理当前阶段的其他指令：按完整指令（含续行）分类，整条保留或整条注释
+                j = start_idx + 1
+                while j < next_idx:
+                    instruction_start = j
+                    while j < next_idx - 1 and (lines[j].rstrip().endswith('\\') or
+                                                (j > instruction_start and _DF_SKIP_RE.match(lines[j]))):
+                        j += 1
+                    instruction = lines[instruction_start:j + 1]
+                    j += 1
                     
-                    # 保留目录创建命令
-                    if 'mkdir' in line_stripped and line_stripped.startswith('RUN '):
-                        simplified_lines.append(line)
-                        continue
-                        
-                    # 处理多行RUN命令
-                    if line_stripped.endswith('\\'):
-                        if 'pip install' in line_stripped or 'apt-get' in line_stripped or 'yum' in line_stripped:
-                            simplified_lines.append(f'# 已移除(需要网络): {line}')
-                            keep_next_line = False
-                        else:
-                            simplified_lines.append(line)
-                        continue
-                        
-                    # 根据上一行的标志决定是否保留当前行
-                    if not keep_next_line:
-                        simplified_lines.append(f'# 已移除(需要网络): {line}')
-                        if not line_stripped.endswith('\\'):
-                            keep_next_line = True  # 重置标志
+                    removed_reason = self._classify_simplified_instruction(instruction)
+                    if removed_reason:
+                        for line in instruction:
+                            emit(f'# 已移除({removed_reason}): {line}')
                     else:
-                        # 对于不确定的行，判断是否与网络相关
-                        if line_stripped.startswith('RUN ') and ('apt-get' in line_stripped or 'yum' in line_stripped or 'http' in line_stripped or 'wget' in line_stripped or 'curl' in line_stripped):
-                            simplified_lines.append(f'# 已移除(需要网络): {line}')
-                        else:
-                            simplified_lines.append(line)
+                        for line in instruction:
+                            emit(line)
             
             # 如果检测到是PyTorch环境，添加PyTorch验证指令
-            if pytorch_detected and not any('import torch' in line for line in simplified_lines):
-                simplified_lines.append('\n# 验证PyTorch环境')
-                simplified_lines.append('RUN python -c "import torch; print(\\"PyTorch version:\\", torch.__version__); print(\\"CUDA available:\\", torch.cuda.is_available())" || echo "PyTorch验证失败"')
+            if pytorch_detected and not has_torch_check:
+                emit('\n# 验证PyTorch环境')
+                emit('RUN python -c "import torch; print(\\"PyTorch version:\\", torch.__version__); print(\\"CUDA available:\\", torch.cuda.is_available())" || echo "PyTorch验证失败"')
             
             # 添加注释说明这是简化版
-            simplified_lines.append('\n# 注意: 这是简化版Dockerfile，已移除需要网络的操作')
+            emit('\n# 注意: 这是简化版Dockerfile，已移除需要网络的操作')
             
             # 确保有最低限度的功能性内容
-            if not any(not line.startswith('#') for line in simplified_lines):
+            if non_comment == 0:
                 self.logger.warning("简化后的Dockerfile没有有效指令")
                 if pytorch_detected:
-                    simplified_lines.append("FROM pytorch/pytorch:latest")
+                    emit("FROM pytorch/pytorch:latest")
                 else:
-                    simplified_lines.append("FROM python:3.9-slim")
-                simplified_lines.append("CMD [\"python\", \"-c\", \"import platform; print('Python version:', platform.python_version())\"]")
+                    emit("FROM python:3.9-slim")
+                emit("CMD [\"python\", \"-c\", \"import platform; print('Python version:', platform.python_version())\"]")
             
-            return '\n'.join(simplified_lines)
+            return buf.getvalue()
             
         except Exception as e:
             self.logger.error(f"创建简化版Dockerfile时出错: {str(e)}", exc_info=True)
@@ -1742,6 +2828,22 @@ CMD ["python", "-c", "print('Emergency fallback Dockerfile')"]
 # 注意: 原始Dockerfile处理失败，这是自动生成的应急版本
 """
 
+    def _classify_simplified_instruction(self, instruction: List[str]) -> Optional[str]:
+        """
+        判断一条Dockerfile指令在简化版Dockerfile中是否需要移除
+        
+        Args:
+            instruction: 指令的所有行（第一行为指令本身，其余为续行）
+            
+        Returns:
+            Optional[str]: 需要移除时返回移除原因，保留时返回None
+        """
+        match = _DF_INSTRUCTION_RE.match(instruction[0])
+        if not match:
+            return _simplified_other_reason(instruction)
+        handler = _DF_REASON_HANDLERS.get(match.group(1).upper(), _simplified_other_reason)
+        return handler(instruction)
+
     def copy_to_container(self, container_id, source_path, target_path):
         """
         将文件从宿主机复制到容器中
@@ -1755,60 +2857,83 @@ CMD ["python", "-c", "print('Emergency fallback Dockerfile')"]
             bool: 是否复制成功
         """
         try:
-            container = self.client.containers.get(container_id)
-            
             # 检查源文件是否存在
             if not os.path.exists(source_path):
                 self.logger.error(f"源文件不存在: {source_path}")
                 return False
                 
-            # 读取源文件内容
-            with open(source_path, 'rb') as f:
-                data = f.read()
-                
             # 确保目标目录存在
             target_dir = os.path.dirname(target_path)
             if target_dir:
-                container.exec_run(f"mkdir -p {target_dir}")
+                self.exec_command_in_container(container_id, f"mkdir -p {target_dir}")
+            else:
+                target_dir = '/'
                 
-            # 使用put_archive方法复制文件
-            # 创建临时tar文件
-            import tarfile
-            import tempfile
-            
             # 获取文件名
             filename = os.path.basename(source_path)
             
-            # 创建临时目录
-            with tempfile.TemporaryDirectory() as tmp_dir:
-                temp_tar_path = os.path.join(tmp_dir, 'temp.tar')
+            # 在后台线程中以流模式生成tar并写入管道，put_archive从管道另一端边读边上传，
+            # 内存占用与文件大小无关
+            import tarfile
+            read_fd, write_fd = os.pipe()
+            writer_errors = []
+            
+            def write_tar():
+                try:
+                    with os.fdopen(write_fd, 'wb', buffering=self.COPY_PIPE_BUFFER_SIZE) as pipe_out, \
+                            tarfile.open(fileobj=pipe_out, mode='w|', bufsize=self.COPY_TAR_BUFSIZE) as tar:
+                        tar.add(source_path, arcname=filename)
+                except Exception as e:
+                    writer_errors.append(e)
+            
+            writer = threading.Thread(target=write_tar, name='copy-to-container-tar', daemon=True)
+            writer.start()
+            try:
+                with os.fdopen(read_fd, 'rb', buffering=self.COPY_PIPE_BUFFER_SIZE) as pipe_in:
+                    success = self.api.put_archive(container_id, target_dir, pipe_in)
+            finally:
+                writer.join()
+            
+            if writer_errors:
+                raise writer_errors[0]
+            if not success:
+                self.logger.error(f"复制文件到容器失败: {source_path} -> {target_path}")
+                return False
                 
-                # 创建tar文件
-                with tarfile.open(temp_tar_path, 'w') as tar:
-                    tar.add(source_path, arcname=filename)
-                    
-                # 读取tar文件内容
-                with open(temp_tar_path, 'rb') as f:
-                    tar_data = f.read()
-                    
-                # 获取目标目录
-                target_dir = os.path.dirname(target_path)
-                if not target_dir:
-                    target_dir = '/'
-                    
-                # 将tar文件复制到容器中
-                success = container.put_archive(target_dir, tar_data)
-                if not success:
-                    self.logger.error(f"复制文件到容器失败: {source_path} -> {target_path}")
-                    return False
-                    
-                self.logger.info(f"成功复制文件到容器: {source_path} -> {target_path}")
-                return True
+            self.logger.info(f"成功复制文件到容器: {source_path} -> {target_path}")
+            return True
                 
         except Exception as e:
             self.logger.error(f"复制文件到容器时出错: {str(e)}")
             return False
 
+    def _get_archive_response(self, container_id: str, path: str):
+        """
+        以流模式请求容器内路径的tar归档
+        
+        与container.get_archive发出相同的请求，但返回HTTP响应本身，
+        调用方提前停止读取时可以关闭响应，不必等到垃圾回收才释放连接
+        
+        Args:
+            container_id: 容器ID
+            path: 容器内路径
+            
+        Returns:
+            requests.Response: 未读取的流式响应
+        """
+        response = self.api._get(
+            self.api._url('/containers/{0}/archive', container_id),
+            params={'path': path},
+            stream=True,
+            headers={'Accept-Encoding': 'identity'}
+        )
+        try:
+            self.api._raise_for_status(response)
+        except DockerException:
+            response.close()
+            raise
+        return response
+
     def copy_from_container(self, container_id, source_path, target_path):
         """
         将文件从容器复制到宿主机
@@ -1822,7 +2947,7 @@ CMD ["python", "-c", "print('Emergency fallback Dockerfile')"]
             bool: 是否复制成功
         """
         try:
-            container = self.client.containers.get(container_id)
+            container = self.get_container(container_id)
             
             # 确保目标目录存在
             target_dir = os.path.dirname(target_path)
@@ -1830,24 +2955,48 @@ CMD ["python", "-c", "print('Emergency fallback Dockerfile')"]
                 os.makedirs(target_dir, exist_ok=True)
                 
             # 从容器复制文件
-            bits, stat = container.get_archive(source_path)
-            
-            # 保存到临时tar文件
-            import tempfile
-            with tempfile.NamedTemporaryFile() as tmp:
-                for chunk in bits:
-                    tmp.write(chunk)
-                tmp.flush()
-                
-                # 解压tar文件到目标路径
-                import tarfile
-                with tarfile.open(tmp.name) as tar:
+            response = self._get_archive_response(container.id, source_path)
+            bits = response.iter_content(self.COPY_PIPE_BUFFER_SIZE)
+            
+            # 后台线程把归档数据流写入管道，另一端以流模式边读边解压，无需临时文件，
+            # 内存占用与文件大小无关
+            import tarfile
+            read_fd, write_fd = os.pipe()
+            writer_errors = []
+            
+            def write_stream():
+                try:
+                    with os.fdopen(write_fd, 'wb', buffering=self.COPY_PIPE_BUFFER_SIZE) as pipe_out:
+                        for chunk in bits:
+                            pipe_out.write(chunk)
+                except BrokenPipeError:
+                    # 读取端只需要第一个条目，提前关闭管道属于正常情况
+                    pass
+                except Exception as e:
+                    writer_errors.append(e)
+                finally:
+                    # 未读完的响应不会自动释放，及时关闭以免占用连接池中的连接
+                    bits.close()
+                    response.close()
+            
+            writer = threading.Thread(target=write_stream, name='copy-from-container-tar', daemon=True)
+            writer.start()
+            try:
+                with os.fdopen(read_fd, 'rb', buffering=self.COPY_PIPE_BUFFER_SIZE) as pipe_in, \
+                        tarfile.open(fileobj=pipe_in, mode='r|', bufsize=self.COPY_TAR_BUFSIZE) as tar:
                     # 获取第一个文件（通常只有一个）
-                    first_member = tar.getmembers()[0]
+                    first_member = tar.next()
+                    if first_member is None:
+                        raise tarfile.ReadError(f"容器返回的归档为空: {source_path}")
                     
                     # 提取文件，重命名为目标文件名
                     first_member.name = os.path.basename(target_path)
                     tar.extract(first_member, os.path.dirname(target_path))
+            finally:
+                writer.join()
+            
+            if writer_errors:
+                raise writer_errors[0]
                     
             self.logger.info(f"成功从容器复制文件: {source_path} -> {target_path}")
             return True
@@ -1869,7 +3018,7 @@ CMD ["python", "-c", "print('Emergency fallback Dockerfile')"]
             bool: 是否复制成功
         """
         try:
-            container = self.client.containers.get(container_id)
+            container = self.get_container(container_id)
             
             # 确保content是二进制
             if isinstance(content, str):
@@ -1880,44 +3029,17 @@ CMD ["python", "-c", "print('Emergency fallback Dockerfile')"]
             if target_dir:
                 container.exec_run(f"mkdir -p {target_dir}")
                 
-            # 使用put_archive方法复制文件
-            # 创建临时tar文件
-            import tarfile
-            import tempfile
-            import io
-            
-            # 获取文件名
+            # 在内存中构建只含目标文件的tar归档，直接交给put_archive，无需临时文件
             filename = os.path.basename(target_path)
+            tar_data = self._build_tar({filename: content})
             
-            # 创建临时目录
-            with tempfile.TemporaryDirectory() as tmp_dir:
-                # 创建临时文件
-                temp_file_path = os.path.join(tmp_dir, filename)
-                with open(temp_file_path, 'wb') as f:
-                    f.write(content)
-                
-                # 创建临时tar文件
-                temp_tar_path = os.path.join(tmp_dir, 'temp.tar')
-                with tarfile.open(temp_tar_path, 'w') as tar:
-                    tar.add(temp_file_path, arcname=filename)
-                
-                # 读取tar文件内容
-                with open(temp_tar_path, 'rb') as f:
-                    tar_data = f.read()
-                
-                # 获取目标目录
-                target_dir = os.path.dirname(target_path)
-                if not target_dir:
-                    target_dir = '/'
-                
-                # 将tar文件复制到容器中
-                success = container.put_archive(target_dir, tar_data)
-                if not success:
-                    self.logger.error(f"复制内容到容器失败: [content] -> {target_path}")
-                    return False
-                
-                self.logger.info(f"成功复制内容到容器文件: {target_path} (大小: {len(content)} 字节)")
-                return True
+            success = container.put_archive(target_dir or '/', tar_data)
+            if not success:
+                self.logger.error(f"复制内容到容器失败: [content] -> {target_path}")
+                return False
+            
+            self.logger.info(f"成功复制内容到容器文件: {target_path} (大小: {len(content)} 字节)")
+            return True
                 
         except Exception as e:
             self.logger.error(f"复制内容到容器时出错: {str(e)}")
@@ -1935,9 +3057,10 @@ CMD ["python", "-c", "print('Emergency fallback Dockerfile')"]
             tuple: (exit_code, output)
         """
         try:
-            container = self.client.containers.get(container_id)
-            result = container.exec_run(command, stderr=True)
-            return result.exit_code, result.output.decode('utf-8', errors='ignore')
+            exec_id = self.api.exec_create(container_id, command, stderr=True)['Id']
+            output = self.api.exec_start(exec_id)
+            exit_code = self.api.exec_inspect(exec_id)['ExitCode']
+            return exit_code, output.decode('utf-8', errors='ignore')
         except Exception as e:
             self.logger.error(f"在容器中执行命令时出错: {str(e)}")
             return -1, str(e)
@@ -1956,62 +3079,95 @@ CMD ["python", "-c", "print('Emergency fallback Dockerfile')"]
             bool: 是否同步成功
         """
         try:
-            container = self.client.containers.get(container_id)
+            container = self.get_container(container_id)
             
             # 确保宿主机目录存在
             if not os.path.exists(host_dir):
                 os.makedirs(host_dir, exist_ok=True)
                 
-            # 确保容器目录存在
-            container.exec_run(f"mkdir -p {container_dir}")
-            
-            # 获取容器中的文件列表
-            result = container.exec_run(f"find {container_dir} -type f | sort")
-            container_files = result.output.decode().strip().split('\n')
-            container_files = [f for f in container_files if f]  # 过滤空行
+            # 确保容器目录存在，这是同步过程中唯一的mkdir；子目录随tar解包创建。
+            # 以参数列表传递路径，避免经过shell分词
+            container.exec_run(["mkdir", "-p", container_dir])
             
-            # 获取宿主机上的文件列表
-            import glob
-            host_files = []
-            for root, _, files in os.walk(host_dir):
-                for file in files:
-                    full_path = os.path.join(root, file)
-                    rel_path = os.path.relpath(full_path, host_dir)
-                    host_files.append(rel_path)
+            import tarfile
+            import shutil
             
             # 根据同步方向执行同步
             if direction in ['to_container', 'both']:
-                # 将宿主机文件同步到容器
-                for rel_path in host_files:
-                    host_file = os.path.join(host_dir, rel_path)
-                    container_file = os.path.join(container_dir, rel_path).replace('\\', '/')
-                    
-                    # 确保容器中目标文件的目录存在
-                    container_file_dir = os.path.dirname(container_file)
-                    if container_file_dir and container_file_dir != container_dir:
-                        container.exec_run(f"mkdir -p {container_file_dir}")
-                        
-                    # 复制文件到容器
-                    self.copy_to_container(container_id, host_file, container_file)
+                # 将宿主机目录下的所有文件打进同一个tar流，只调用一次put_archive，
+                # 缺失的子目录由Docker解包时自动创建
+                read_fd, write_fd = os.pipe()
+                writer_errors = []
+                
+                def write_tar():
+                    try:
+                        with os.fdopen(write_fd, 'wb', buffering=self.COPY_PIPE_BUFFER_SIZE) as pipe_out, \
+                                tarfile.open(fileobj=pipe_out, mode='w|', bufsize=self.COPY_TAR_BUFSIZE) as tar:
+                            for root, _, files in os.walk(host_dir):
+                                for file in files:
+                                    full_path = os.path.join(root, file)
+                                    rel_path = os.path.relpath(full_path, host_dir).replace('\\', '/')
+                                    tar.add(full_path, arcname=rel_path)
+                    except Exception as e:
+                        writer_errors.append(e)
+                
+                writer = threading.Thread(target=write_tar, name='sync-to-container-tar', daemon=True)
+                writer.start()
+                try:
+                    with os.fdopen(read_fd, 'rb', buffering=self.COPY_PIPE_BUFFER_SIZE) as pipe_in:
+                        success = self.api.put_archive(container.id, container_dir, pipe_in)
+                finally:
+                    writer.join()
+                
+                if writer_errors:
+                    raise writer_errors[0]
+                if not success:
+                    self.logger.error(f"同步目录到容器失败: {host_dir} -> {container_dir}")
+                    return False
             
             if direction in ['from_container', 'both']:
-                # 将容器文件同步到宿主机
-                for container_file in container_files:
-                    # 计算相对路径
-                    if container_file.startswith(container_dir):
-                        rel_path = container_file[len(container_dir):].lstrip('/')
-                    else:
-                        continue  # 跳过不在指定目录下的文件
-                        
-                    host_file = os.path.join(host_dir, rel_path)
-                    
-                    # 确保宿主机中目标文件的目录存在
-                    host_file_dir = os.path.dirname(host_file)
-                    if host_file_dir and not os.path.exists(host_file_dir):
-                        os.makedirs(host_file_dir, exist_ok=True)
-                        
-                    # 复制文件到宿主机
-                    self.copy_from_container(container_id, container_file, host_file)
+                # 一次get_archive取回整个容器目录的tar流，边读边解包到宿主机目录，
+                # 归档中的条目以容器目录名为首级路径，解包时去掉这一级
+                response = self._get_archive_response(container.id, container_dir)
+                bits = response.iter_content(self.COPY_PIPE_BUFFER_SIZE)
+                read_fd, write_fd = os.pipe()
+                writer_errors = []
+                
+                def write_stream():
+                    try:
+                        with os.fdopen(write_fd, 'wb', buffering=self.COPY_PIPE_BUFFER_SIZE) as pipe_out:
+                            for chunk in bits:
+                                pipe_out.write(chunk)
+                    except BrokenPipeError:
+                        pass
+                    except Exception as e:
+                        writer_errors.append(e)
+                    finally:
+                        bits.close()
+                        response.close()
+                
+                writer = threading.Thread(target=write_stream, name='sync-from-container-tar', daemon=True)
+                writer.start()
+                try:
+                    with os.fdopen(read_fd, 'rb', buffering=self.COPY_PIPE_BUFFER_SIZE) as pipe_in, \
+                            tarfile.open(fileobj=pipe_in, mode='r|', bufsize=self.COPY_TAR_BUFSIZE) as tar:
+                        host_root = os.path.realpath(host_dir)
+                        for member in tar:
+                            # 只同步普通文件，跳过目录、链接和设备文件，避免链接指向宿主机目录之外
+                            if not member.isfile():
+                                continue
+                            _, _, rel_path = member.name.partition('/')
+                            host_file = os.path.realpath(os.path.join(host_root, rel_path))
+                            if not host_file.startswith(host_root + os.sep):
+                                continue
+                            os.makedirs(os.path.dirname(host_file), exist_ok=True)
+                            with tar.extractfile(member) as src, open(host_file, 'wb') as dst:
+                                shutil.copyfileobj(src, dst, self.COPY_PIPE_BUFFER_SIZE)
+                finally:
+                    writer.join()
+                
+                if writer_errors:
+                    raise writer_errors[0]
                     
             return True
             
@@ -2029,30 +3185,24 @@ CMD ["python", "-c", "print('Emergency fallback Dockerfile')"]
             dict: 包含Jupyter检查结果的字典
         """
         try:
-            container = self.client.containers.get(container_id)
+            container = self.get_container(container_id)
             
-            # 检查jupyter是否已安装
-            check_cmd = "which jupyter || echo 'NOT_INSTALLED'"
-            result = container.exec_run(check_cmd)
-            installed = not result.output.decode('utf-8', errors='ignore').strip().endswith('NOT_INSTALLED')
+            # 一次exec完成检查：jupyter路径 + 直接列出内核目录（内核目录即权威的kernelspec来源）
+            result = container.exec_run(["bash", "-c", _JUPYTER_CHECK_SCRIPT])
+            results = self._parse_script_output(result.output.decode('utf-8', errors='ignore'))
+            jupyter_path = results.get('J', 'NOT_INSTALLED')
+            installed = jupyter_path != 'NOT_INSTALLED'
             
-            # 检查kernel列表
+            # 解析kernel列表
             kernels = []
             if installed:
-                try:
-                    kernel_cmd = "jupyter kernelspec list"
-                    kernel_result = container.exec_run(kernel_cmd)
-                    kernel_output = kernel_result.output.decode('utf-8', errors='ignore')
-                    # 解析kernel输出
-                    for line in kernel_output.splitlines():
-                        if "python" in line.lower():
-                            kernels.append(line.strip())
-                except:
-                    pass
+                for line in results.get('KERNEL', '').splitlines():
+                    if "python" in line.lower():
+                        kernels.append(line.strip())
             
             return {
                 "installed": installed,
-                "output": result.output.decode('utf-8', errors='ignore'),
+                "output": jupyter_path,
                 "kernels": kernels
             }
         except Exception as e:
@@ -2062,6 +3212,8 @@ CMD ["python", "-c", "print('Emergency fallback Dockerfile')"]
     def install_jupyter_kernel_in_container(self, container_id, kernel_name=None):
         """在容器中安装Jupyter内核
         
+        检测pip、安装ipykernel、获取Python版本、注册内核和验证内核文件在同一个脚本中完成，只需一次exec
+        
         Args:
             container_id: 容器ID
             kernel_name: 内核名称，默认为自动生成
@@ -2070,7 +3222,7 @@ CMD ["python", "-c", "print('Emergency fallback Dockerfile')"]
             dict: 安装结果
         """
         try:
-            container = self.client.containers.get(container_id)
+            container = self.get_container(container_id)
             self.logger.info(f"开始在容器 {container_id[:12]} 中安装Jupyter内核")
             
             # 如果未指定kernel名称，使用容器ID的前8位作为名称
@@ -2078,127 +3230,52 @@ CMD ["python", "-c", "print('Emergency fallback Dockerfile')"]
                 kernel_name = f"python-container-{container_id[:8]}"
             self.logger.info(f"目标内核名称: {kernel_name}")
             
-            # 检查pip是否存在，优先使用pip3
-            pip_cmd_check = "(pip3 --version > /dev/null 2>&1 && echo 'pip3') || (pip --version > /dev/null 2>&1 && echo 'pip') || echo 'PIP_NOT_FOUND'"
-            pip_result = container.exec_run(["bash", "-c", pip_cmd_check], environment={'PATH': '/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin'}) # Add ENV
-            pip_cmd = pip_result.output.decode('utf-8', errors='ignore').strip()
+            script_result = container.exec_run(
+                ["bash", "-c", _KERNEL_INSTALL_SCRIPT, "_", kernel_name],
+                privileged=True,
+                environment=self._CONTAINER_ENV
+            )
+            results = self._parse_script_output(script_result.output.decode('utf-8', errors='ignore'))
             
-            if pip_cmd == 'PIP_NOT_FOUND':
+            # 检查pip是否存在，优先使用pip3
+            pip_cmd = results.get('PIP')
+            if not pip_cmd:
                 self.logger.error("容器中未找到pip或pip3，无法安装ipykernel")
                 return {"success": False, "error": "pip not found in container"}
             self.logger.info(f"使用pip命令: {pip_cmd}")
-                
-            # 在容器中安装ipykernel
-            install_ipykernel_cmd = f"{pip_cmd} install --no-cache-dir --upgrade ipykernel"
-            self.logger.info(f"执行安装ipykernel命令: {install_ipykernel_cmd}")
-            install_result = container.exec_run(install_ipykernel_cmd, privileged=True, environment={'PATH': '/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin'}) # Add ENV
             
-            if install_result.exit_code != 0:
-                error_output = install_result.output.decode('utf-8', errors='ignore')
-                self.logger.error(f"安装ipykernel失败, Exit Code: {install_result.exit_code}\\nOutput:\\n{error_output[:500]}")
+            # 在容器中安装ipykernel
+            if results.get('INSTALL_RC') != '0':
+                error_output = results.get('INSTALL_LOG', '')
+                self.logger.error(f"安装ipykernel失败, Exit Code: {results.get('INSTALL_RC')}\nOutput:\n{error_output[:500]}")
                 return {"success": False, "error": f"Failed to install ipykernel: {error_output[:100]}"}
             self.logger.info("ipykernel安装成功")
-
-            # --- 获取容器中的Python版本信息 和 可执行文件名 (新方法) ---
-            python_version = 'Unknown'
-            python_exec_name = None
-            
-            # 尝试 python3
-            cmd_py3_ver = "python3 -V"
-            py3_ver_result = container.exec_run(cmd_py3_ver, environment={'PATH': '/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin'})
-            if py3_ver_result.exit_code == 0:
-                python_version_str = py3_ver_result.output.decode('utf-8', errors='ignore').strip()
-                match = re.search(r'(\d+\.\d+(\.\d+)?)', python_version_str)
-                if match:
-                    python_version = match.group(1)
-                    python_exec_name = "python3"
-                    self.logger.info(f"找到 Python 3 版本: {python_version} (可执行名: {python_exec_name})")
-            
-            # 如果没找到 python3 或版本解析失败，尝试 python
-            if python_exec_name is None:
-                cmd_py_ver = "python -V"
-                py_ver_result = container.exec_run(cmd_py_ver, environment={'PATH': '/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin'})
-                if py_ver_result.exit_code == 0:
-                    python_version_str = py_ver_result.output.decode('utf-8', errors='ignore').strip()
-                    match = re.search(r'(\d+\.\d+(\.\d+)?)', python_version_str)
-                    if match:
-                        python_version = match.group(1)
-                        python_exec_name = "python"
-                        self.logger.info(f"找到 Python 版本: {python_version} (可执行名: {python_exec_name})")
             
-            # 如果两者都失败
-            if python_exec_name is None:
-                self.logger.error("无法执行 'python3 -V' 或 'python -V' 来确定 Python 版本和可执行文件名")
+            # 获取容器中的Python版本信息和可执行文件
+            python_exec_name = results.get('PY')
+            version_match = _PY_VER_RE.search(results.get('VER', ''))
+            python_version = version_match.group(1) if version_match else None
+            if not python_exec_name or not python_version:
+                self.logger.error("无法执行 'python3' 或 'python' 来确定 Python 版本和可执行文件名")
                 return {"success": False, "error": "Could not determine Python version or executable name (python/python3)."}
-                
-            self.logger.info(f"容器中的 Python 版本: {python_version}")
-
-            # 构建内核显示名称
+            self.logger.info(f"容器中的 Python 版本: {python_version} (可执行文件: {python_exec_name})")
+            
+            # 内核显示名称，与脚本中注册时使用的名称一致
             display_name = f"Docker Image (Python {python_version})"
             self.logger.info(f"内核显示名称: {display_name}")
-
-            # --- 获取Python可执行文件路径 (修复版) ---
-            # (此部分不再需要，我们直接使用上面找到的 python_exec_name)
-            # python_exec_path = None
-            # # 优先尝试 python3
-            # cmd_py3 = "command -v python3"
-            # py3_result = container.exec_run(cmd_py3, environment={'PATH': '/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin'})
-            # if py3_result.exit_code == 0:
-            #     python_exec_path = py3_result.output.decode('utf-8', errors='ignore').strip()
-            #     self.logger.info(f"找到 Python 3 可执行文件: {python_exec_path}")
-            # else:
-            #     # 尝试 python
-            #     cmd_py = "command -v python"
-            #     py_result = container.exec_run(cmd_py, environment={'PATH': '/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin'})
-            #     if py_result.exit_code == 0:
-            #         python_exec_path = py_result.output.decode('utf-8', errors='ignore').strip()
-            #         self.logger.info(f"找到 Python 可执行文件: {python_exec_path}")
-            #     else:
-            #         # 两者都找不到
-            #         self.logger.error("在容器中未找到 python 或 python3 命令")
-            #         return {"success": False, "error": "Python executable (python or python3) not found in container."}
-
-            # # 验证路径是否有效
-            # if not python_exec_path: # 或添加其他检查，如是否包含空格等
-            #     self.logger.error(f"获取到的 Python 路径无效: '{python_exec_path}'")
-            #     return {"success": False, "error": "Invalid Python executable path obtained."}
-
-            # self.logger.info(f"最终使用的 Python 可执行文件: {python_exec_path}")
-
+            
             # 在容器中注册内核 (系统范围，不带 --prefix)
-            # 修正 register_cmd 中的转义字符, 并使用 python_exec_name
-            register_cmd = f'{python_exec_name} -m ipykernel install --name={kernel_name} --display-name="{display_name}"'
-            self.logger.info(f"执行注册内核命令 (系统范围): {register_cmd}")
-            register_result = container.exec_run(["bash", "-c", register_cmd], privileged=True, environment={'PATH': '/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin'})
-            output = register_result.output.decode('utf-8', errors='ignore')
-
-            if register_result.exit_code != 0:
-                self.logger.error(f"注册内核失败, Exit Code: {register_result.exit_code}\\nOutput:\\n{output[:500]}")
+            output = results.get('REGISTER_LOG', '')
+            if results.get('REGISTER_RC') != '0':
+                self.logger.error(f"注册内核失败, Exit Code: {results.get('REGISTER_RC')}\nOutput:\n{output[:500]}")
                 return {"success": False, "error": f"Failed to register kernel: {output[:100]}"}
             self.logger.info(f"内核注册命令执行成功，输出: {output.strip()}")
-
-            # 增加短暂延迟，等待文件系统更新
-            time.sleep(2)
             
-            # --- 验证内核文件 (主要用于调试，即使列表确认失败也继续) ---
-            possible_paths_to_check = [
-                f"/usr/local/share/jupyter/kernelspecs/{kernel_name}",
-                f"/usr/share/jupyter/kernelspecs/{kernel_name}"
-            ]
-            kernelspec_file_found = False
-            self.logger.info(f"开始验证内核文件，检查路径: {possible_paths_to_check}")
-            for check_dir in possible_paths_to_check:
-                kernelspec_file = f"{check_dir}/kernel.json"
-                check_file_cmd = f"cat {kernelspec_file} || echo 'FILE_NOT_FOUND'"
-                self.logger.info(f"尝试读取内核文件: {kernelspec_file}")
-                file_check_result = container.exec_run(["bash", "-c", check_file_cmd], environment={'PATH': '/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin'}) # Add ENV
-                file_content = file_check_result.output.decode('utf-8', errors='ignore').strip()
-                if file_content != 'FILE_NOT_FOUND':
-                    kernelspec_file_found = True
-                    self.logger.info(f"找到内核文件于: {kernelspec_file}")
-                    break
-            if not kernelspec_file_found:
-                 self.logger.warning(f"在检查路径 {possible_paths_to_check} 中未找到内核文件 kernel.json! 但将继续操作。")
+            # 验证内核文件 (主要用于调试，即使未找到也继续)
+            if results.get('FOUND'):
+                self.logger.info(f"找到内核文件于: {results['FOUND']}")
+            else:
+                self.logger.warning(f"未找到内核 {kernel_name} 的 kernel.json! 但将继续操作。")
 
             # 返回成功，因为安装命令本身是成功的
             return {
@@ -2215,6 +3292,142 @@ CMD ["python", "-c", "print('Emergency fallback Dockerfile')"]
             self.logger.error(traceback.format_exc())
             return {"success": False, "error": str(e)}
 
+    @staticmethod
+    def _parse_script_output(output: str) -> Dict[str, str]:
+        """
+        解析容器内脚本输出的KEY=value行
+        
+        同一个KEY出现多次时按行拼接，不含'='的行被忽略
+        
+        Args:
+            output: 脚本输出
+            
+        Returns:
+            Dict[str, str]: 解析结果
+        """
+        results = {}
+        for line in output.splitlines():
+            key, sep, value = line.partition('=')
+            if not sep or not key.isupper():
+                continue
+            results[key] = f"{results[key]}\n{value}" if key in results else value
+        return results
+
+    @staticmethod
+    def _jupyter_image_name(base_image_id: str) -> Optional[str]:
+        """
+        获取基于指定基础镜像预装了Jupyter的派生镜像名称，例如"sha256:ab12..." -> "mlride-jupyter:ab12..."
+        
+        Args:
+            base_image_id: 基础镜像ID
+            
+        Returns:
+            Optional[str]: 派生镜像名称，ID格式无效时返回None
+        """
+        digest = (base_image_id or '').rpartition(':')[2]
+        if not digest or not all(c in string.hexdigits for c in digest):
+            return None
+        return f"{_JUPYTER_IMAGE_REPO}:{digest.lower()}"
+
+    def _schedule_jupyter_image_build(self, base_image_id: str):
+        """
+        在后台线程中为基础镜像构建预装Jupyter的派生镜像，不阻塞当前请求
+        
+        Args:
+            base_image_id: 基础镜像ID
+        """
+        derived = self._jupyter_image_name(base_image_id)
+        if not derived:
+            return
+        with DockerClient._jupyter_image_builds_lock:
+            if base_image_id in DockerClient._jupyter_image_builds:
+                return
+            DockerClient._jupyter_image_builds.add(base_image_id)
+        
+        def build():
+            try:
+                self._build_jupyter_image(base_image_id, derived)
+            finally:
+                with DockerClient._jupyter_image_builds_lock:
+                    DockerClient._jupyter_image_builds.discard(base_image_id)
+        
+        # 安装可能耗时数分钟，使用独立线程，不占用短查询线程池
+        threading.Thread(target=build, name='jupyter-image-build', daemon=True).start()
+
+    def _build_jupyter_image(self, base_image_id: str, derived: str) -> bool:
+        """
+        基于干净的基础镜像构建预装Jupyter的派生镜像
+        
+        派生镜像从基础镜像ID重新构建，而不是提交正在使用的容器，因此不会带入任何用户的文件和状态
+        
+        Args:
+            base_image_id: 基础镜像ID
+            derived: 派生镜像名称
+            
+        Returns:
+            bool: 是否构建成功
+        """
+        import io
+        try:
+            self.api.inspect_image(derived)
+            return True
+        except DockerException:
+            pass
+        
+        dockerfile = _JUPYTER_IMAGE_DOCKERFILE.substitute(base=base_image_id)
+        try:
+            self._consume_build_stream(self.api.build(
+                fileobj=io.BytesIO(dockerfile.encode('utf-8')),
+                tag=derived,
+                rm=True,
+                forcerm=True,
+                pull=False,
+                decode=True
+            ))
+            self.logger.info(f"已构建预装Jupyter的镜像 {derived}")
+            return True
+        except DockerException as e:
+            self.logger.warning(f"构建预装Jupyter的镜像 {derived} 失败: {str(e)}")
+            return False
+
+    @staticmethod
+    def _build_tar(files: Dict[str, bytes]) -> bytes:
+        """
+        在内存中构建tar归档，用于put_archive写入容器
+        
+        路径中的父目录会作为目录条目一并写入，解压时自动创建
+        
+        Args:
+            files: {归档内相对路径: 文件内容}
+            
+        Returns:
+            bytes: tar归档数据
+        """
+        import io
+        import tarfile
+        buf = io.BytesIO()
+        now = time.time()
+        with tarfile.open(fileobj=buf, mode='w') as tar:
+            added_dirs = set()
+            for path, data in files.items():
+                parts = path.split('/')[:-1]
+                for i in range(1, len(parts) + 1):
+                    dir_path = '/'.join(parts[:i])
+                    if dir_path in added_dirs:
+                        continue
+                    dir_info = tarfile.TarInfo(dir_path)
+                    dir_info.type = tarfile.DIRTYPE
+                    dir_info.mode = 0o755
+                    dir_info.mtime = now
+                    tar.addfile(dir_info)
+                    added_dirs.add(dir_path)
+                info = tarfile.TarInfo(path)
+                info.size = len(data)
+                info.mode = 0o644
+                info.mtime = now
+                tar.addfile(info, io.BytesIO(data))
+        return buf.getvalue()
+
     def start_jupyter_in_container(self, container_id, port=8888, token=None):
         """
         在容器中启动Jupyter服务
@@ -2228,7 +3441,6 @@ CMD ["python", "-c", "print('Emergency fallback Dockerfile')"]
             dict: 包含启动状态和错误信息的字典
         """
         import time
-        import json
         import logging
         
         logger = logging.getLogger(__name__)
@@ -2263,280 +3475,203 @@ CMD ["python", "-c", "print('Emergency fallback Dockerfile')"]
                 if 'IPAddress' in network_config:
                     logger.info(f"容器网络 {network_name}: {network_config['IPAddress']}")
             
-            # 检查操作系统和发行版
-            os_info_cmd = "cat /etc/os-release || echo 'OS信息不可用'"
-            os_info = container.exec_run(os_info_cmd)
-            logger.info(f"容器OS信息: {os_info.output.decode()[:200]}")
-            
-            # 终止现有的Jupyter进程
-            logger.info('尝试终止现有Jupyter进程')
-            kill_cmd = "pkill -f jupyter || pkill -f notebook || true"
-            kill_result = container.exec_run(kill_cmd)
-            logger.info(f'终止现有进程结果: {kill_result.output.decode()}')
+            # 创建Jupyter配置，令牌以Python字面量写入，避免其中的引号破坏配置文件
+            config_content = _JUPYTER_CONFIG_TMPL.substitute(port=port, token=repr(token or ""))
             
-            # 等待进程完全终止
-            time.sleep(2)
-            
-            # 检查Python版本
-            logger.info("检查容器中的Python环境")
-            python_version_cmd = "python --version || python3 --version || echo 'Python未安装'"
-            python_version = container.exec_run(python_version_cmd)
-            logger.info(f"Python版本: {python_version.output.decode()}")
-            
-            # 尝试使用多种方法安装pip
-            logger.info("开始检查和安装pip")
-            install_pip_success = False
-            
-            # 方法1: 检查pip或pip3是否已安装
-            check_pip_cmd = "which pip || which pip3 || echo 'NOT_FOUND'"
-            pip_result = container.exec_run(check_pip_cmd)
-            pip_path = pip_result.output.decode().strip()
-            
-            if pip_path != 'NOT_FOUND':
-                logger.info(f"找到pip: {pip_path}")
-                install_pip_success = True
-            else:
-                logger.warning("未找到pip，尝试安装...")
-                
-                # 方法2: 使用apt-get安装pip
-                logger.info("尝试使用apt-get安装pip")
-                apt_cmd = "apt-get update && apt-get install -y python3-pip || echo 'APT安装失败'"
-                apt_result = container.exec_run(apt_cmd)
-                logger.info(f"apt-get安装结果: {apt_result.output.decode()[:200]}")
-                
-                # 检查是否安装成功
-                pip_check = container.exec_run("which pip || which pip3 || echo 'NOT_FOUND'")
-                if pip_check.output.decode().strip() != 'NOT_FOUND':
-                    logger.info("使用apt-get成功安装pip")
-                    install_pip_success = True
-                else:
-                    # 方法3: 使用get-pip.py脚本
-                    logger.info("尝试使用get-pip.py安装pip")
-                    get_pip_cmd = """
-                    curl -s https://bootstrap.pypa.io/get-pip.py -o get-pip.py && 
-                    (python get-pip.py || python3 get-pip.py) &&
-                    rm get-pip.py || echo '安装失败'
-                    """
-                    get_pip_result = container.exec_run(["bash", "-c", get_pip_cmd])
-                    logger.info(f"get-pip.py安装结果: {get_pip_result.output.decode()[:200]}")
-                    
-                    # 再次检查pip
-                    pip_check = container.exec_run("which pip || which pip3 || echo 'NOT_FOUND'")
-                    if pip_check.output.decode().strip() != 'NOT_FOUND':
-                        logger.info("使用get-pip.py成功安装pip")
-                        install_pip_success = True
-            
-            if not install_pip_success:
-                logger.error("无法在容器中安装pip，无法继续安装Jupyter")
+            # 在一次exec中完成终止旧进程、安装Jupyter和创建工作目录
+            logger.info("开始在容器中准备Jupyter环境")
+            # 同一容器已检测过的环境信息直接复用，脚本会跳过检测和安装步骤
+            cached_env = DockerClient._container_env_cache.get(container.id, {})
+            bootstrap_result = container.exec_run([
+                "bash", "-c", _JUPYTER_BOOTSTRAP_SCRIPT, "_", cached_env.get('JUPYTER', '')
+            ])
+            results = {
+                **cached_env,
+                **self._parse_script_output(bootstrap_result.output.decode('utf-8', errors='ignore'))
+            }
+            logger.info(f"容器OS信息: {results.get('OS') or 'OS信息不可用'}")
+            logger.info(f"Python版本: {results.get('PY') or 'Python未安装'}")
+            
+            pip_path = results.get('PIP', '')
+            if results.get('CACHED'):
+                logger.info("该容器已完成Jupyter环境准备，跳过检测和安装")
+            elif results.get('PREINSTALLED'):
+                logger.info("镜像中已预装Jupyter，跳过安装")
+            elif not pip_path:
+                # 运行时不再通过apt-get/get-pip.py联网安装pip，这一步应在构建镜像时完成
+                logger.error("容器中没有pip，无法安装Jupyter")
                 return {
                     'status': 'error',
-                    'error_details': '无法在容器中安装pip，请确保容器环境支持Python和pip'
+                    'error_details': '基础镜像中缺少pip，请在Dockerfile中安装python3-pip后重新构建镜像'
                 }
+            else:
+                logger.info(f"找到pip: {pip_path}")
             
             # 确定pip命令
             pip_cmd = "pip3" if "pip3" in pip_path else "pip"
             logger.info(f"使用pip命令: {pip_cmd}")
             
-            # 安装Jupyter
-            logger.info("开始安装Jupyter")
-            install_cmd = f"{pip_cmd} install --no-cache-dir 'notebook<7.0.0'"  # 使用旧版本避免配置兼容性问题
-            logger.info(f"执行安装命令: {install_cmd}")
-            install_result = container.exec_run(install_cmd)
-            logger.info(f"Jupyter安装输出: {install_result.output.decode()[:500]}")
-            
-            if install_result.exit_code != 0:
-                logger.error(f"安装Jupyter失败: {install_result.output.decode()}")
+            if results.get('INSTALL_RC') != '0':
+                logger.error(f"安装Jupyter失败: {results.get('INSTALL_LOG', '')}")
                 return {
                     'status': 'error',
                     'error_details': f'安装Jupyter失败，请检查容器环境'
                 }
             
-            # 检查安装结果
-            jupyter_check = container.exec_run("jupyter --version || echo 'NOT_FOUND'")
-            if 'NOT_FOUND' in jupyter_check.output.decode():
-                logger.error("Jupyter安装成功但命令不可用，检查PATH环境变量")
-                # 尝试查找jupyter可执行文件
-                find_jupyter = container.exec_run("find / -name jupyter -type f 2>/dev/null || echo 'NOT_FOUND'")
-                logger.info(f"查找jupyter可执行文件结果: {find_jupyter.output.decode()[:200]}")
-            
-            # 创建工作目录
-            logger.info("创建工作目录")
-            container.exec_run('mkdir -p /workspace')
-            
-            # 创建Jupyter配置目录
-            logger.info("创建Jupyter配置目录")
-            container.exec_run('mkdir -p /root/.jupyter')
-            
-            # 创建Jupyter配置
-            logger.info("创建Jupyter配置文件")
-            config_content = f"""
-c = get_config()
-
-# 同时支持新旧版本的配置
-c.ServerApp.ip = '0.0.0.0'  # 新版本
-c.ServerApp.port = {port}
-c.ServerApp.token = '{token if token else ""}'
-c.ServerApp.notebook_dir = '/workspace'
-c.ServerApp.allow_root = True
-c.ServerApp.disable_check_xsrf = True
-c.ServerApp.allow_origin = '*'
-c.ServerApp.tornado_settings = {{'headers': {{'Content-Security-Policy': "frame-ancestors * 'self';"}}}}
-
-# 兼容旧版本配置
-c.NotebookApp.ip = '0.0.0.0'
-c.NotebookApp.port = {port}
-c.NotebookApp.token = '{token if token else ""}'
-c.NotebookApp.notebook_dir = '/workspace'
-c.NotebookApp.allow_root = True
-c.NotebookApp.disable_check_xsrf = True
-c.NotebookApp.allow_origin = '*'
-c.NotebookApp.tornado_settings = {{'headers': {{'Content-Security-Policy': "frame-ancestors * 'self';"}}}}
-"""
-            # 写入配置文件
-            config_cmd = f"""cat > /root/.jupyter/jupyter_notebook_config.py << 'EOL'
-{config_content}
-EOL"""
-            config_result = container.exec_run(["bash", "-c", config_cmd])
-            if config_result.exit_code != 0:
-                logger.error(f"创建Jupyter配置失败: {config_result.output.decode()}")
+            # 获取正确的jupyter路径
+            jupyter_path = results.get('JUPYTER', '')
+            if not jupyter_path:
+                logger.error("找不到jupyter可执行文件")
+                # 只在pip常用的安装位置查找jupyter可执行文件，避免扫描整个文件系统
+                find_jupyter_cmd = (
+                    'PY=$(command -v python3 || command -v python); '
+                    'for f in /usr/local/bin/jupyter /usr/bin/jupyter /root/.local/bin/jupyter '
+                    '"$("$PY" -c "import sysconfig; print(sysconfig.get_path(\'scripts\'))")/jupyter"; '
+                    'do [ -f "$f" ] && echo "$f"; done'
+                )
+                find_jupyter = container.exec_run(["bash", "-c", find_jupyter_cmd])
+                logger.info(f"查找jupyter可执行文件结果: {find_jupyter.output.decode()[:200] or 'NOT_FOUND'}")
                 return {
                     'status': 'error',
-                    'error_details': '创建Jupyter配置文件失败'
+                    'error_details': '找不到jupyter可执行文件，安装可能不完整'
                 }
             
-            # 验证配置文件
-            check_config = container.exec_run("cat /root/.jupyter/jupyter_notebook_config.py")
-            logger.info(f"Jupyter配置文件内容: {check_config.output.decode()[:200]}...")
+            logger.info(f"找到jupyter路径: {jupyter_path}")
+            DockerClient._container_env_cache[container.id] = {
+                key: results[key] for key in ('PY', 'PIP', 'JUPYTER') if key in results
+            }
             
-            # 获取正确的jupyter路径
-            jupyter_path_cmd = "which jupyter || echo 'NOT_FOUND'"
-            jupyter_path_result = container.exec_run(jupyter_path_cmd)
-            jupyter_path = jupyter_path_result.output.decode().strip()
+            # 首次在运行时安装了Jupyter时，在后台基于干净的基础镜像构建派生镜像，之后同一基础镜像创建的容器无需再安装
+            if not results.get('CACHED') and not results.get('PREINSTALLED'):
+                self._schedule_jupyter_image_build(container.attrs.get('Image'))
             
-            if jupyter_path == 'NOT_FOUND':
-                logger.error("找不到jupyter可执行文件")
+            # 通过归档接口直接写入配置文件，令牌不会出现在容器内进程的命令行中
+            config_tar = self._build_tar({'.jupyter/jupyter_notebook_config.py': config_content.encode('utf-8')})
+            if not container.put_archive('/root', config_tar):
+                logger.error("创建Jupyter配置失败")
                 return {
                     'status': 'error',
-                    'error_details': '找不到jupyter可执行文件，安装可能不完整'
+                    'error_details': '创建Jupyter配置文件失败'
                 }
             
-            logger.info(f"找到jupyter路径: {jupyter_path}")
-            
             # 使用完整路径启动Jupyter
             start_cmd = f"{jupyter_path} notebook --ip=0.0.0.0 --port={port} --no-browser --allow-root --config=/root/.jupyter/jupyter_notebook_config.py"
             logger.info(f"启动命令: {start_cmd}")
             
-            # 使用nohup确保进程在后台运行
-            nohup_cmd = f"nohup {start_cmd} > /var/log/jupyter.log 2>&1 &"
-            jupyter_process = container.exec_run(
-                ["bash", "-c", nohup_cmd],
-                detach=True,
+            # 以分离模式执行，exec替换掉bash，无需nohup和后台进程；
+            # 日志已由准备脚本清空，这里以追加方式打开，分离执行的时机不会影响随后的日志跟踪
+            jupyter_exec_id = self.api.exec_create(
+                container.id,
+                ["bash", "-c", f"exec {start_cmd} >> /var/log/jupyter.log 2>&1"],
                 privileged=True,
                 environment={
                     'PATH': '/usr/local/bin:/usr/bin:/bin:/usr/local/sbin:/usr/sbin:/sbin:/root/.local/bin',
                     'HOME': '/root',
                     'PYTHONUNBUFFERED': '1'
                 }
-            )
+            )['Id']
+            self.api.exec_start(jupyter_exec_id, detach=True)
             
             logger.info("Jupyter启动命令已执行，等待服务就绪")
             
-            # 等待服务启动
-            max_retries = 20  # 增加重试次数
-            retry_interval = 3  # 增加等待时间
-            for i in range(max_retries):
-                logger.info(f"等待服务启动，第 {i+1}/{max_retries} 次检查")
-                time.sleep(retry_interval)
-                
-                # 检查进程是否在运行
-                ps_cmd = "ps aux | grep 'jupyter-notebook' | grep -v grep || true"
-                ps_result = container.exec_run(ps_cmd)
-                ps_output = ps_result.output.decode()
-                
-                if 'jupyter-notebook' in ps_output:
-                    logger.info(f"检测到Jupyter进程: {ps_output.strip()[:100]}...")
-                    
-                    # 检查日志
+            # 跟踪Jupyter日志，一旦出现启动完成的输出立即返回；timeout保证日志流在超时后结束
+            start_timeout = self.JUPYTER_START_TIMEOUT
+            ready_re = re.compile(rf'is running at|http://[^\s/]*:{port}/')
+            deadline = time.monotonic() + start_timeout
+            tail_result = container.exec_run(
+                f"timeout {start_timeout} tail -n +1 -F /var/log/jupyter.log",
+                stream=True
+            )
+            log_output = ''
+            ready = False
+            error_logged = False
+            try:
+                for chunk in tail_result.output:
+                    text = chunk.decode('utf-8', errors='ignore')
+                    log_output = (log_output + text)[-4096:]
+                    # 只检查新增内容，保留少量重叠以匹配跨块的行
+                    recent = log_output[-(len(text) + 256):]
+                    if ready_re.search(recent):
+                        ready = True
+                        break
+                    if not error_logged and ("Error:" in recent or "Exception:" in recent):
+                        logger.warning(f"Jupyter日志中发现错误: {recent}")
+                        error_logged = True
+                    if time.monotonic() > deadline:
+                        break
+            finally:
+                tail_result.output.close()
+            
+            if ready:
+                logger.info("Jupyter服务已成功启动")
+                return {
+                    'status': 'success',
+                    'port': port,
+                    'token': token
+                }
+            
+            logger.warning(f"Jupyter日志: {log_output[-500:]}")
+            jupyter_exec = self.api.exec_inspect(jupyter_exec_id)
+            if not jupyter_exec.get('Running'):
+                logger.warning(f"Jupyter进程已退出，退出码: {jupyter_exec.get('ExitCode')}")
+            
+            # 日志中没有启动信息时，最后检查一次端口是否在监听
+            ss_cmd = f'ss -H -ltn "sport = :{port}"'
+            ss_result = container.exec_run(ss_cmd)
+            ss_output = ss_result.output.decode().strip()
+            if ss_result.exit_code == 0 and ss_output:
+                logger.info(f"端口 {port} 已在监听: {ss_output}")
+                logger.info("Jupyter服务已成功启动")
+                return {
+                    'status': 'success',
+                    'port': port,
+                    'token': token
+                }
+            
+            # 收集详细诊断信息，各项检查互不依赖，并发执行
+            logger.info("收集详细诊断信息")
+            diag_cmds = [
+                ("内存状态", "free -m || true", None),
+                ("磁盘状态", "df -h || true", None),
+                ("Python包列表", f"{pip_cmd} list || true", 300),
+                ("Jupyter帮助输出", f"{jupyter_path} notebook --help 2>&1 || echo 'jupyter命令失败'", 300),
+                ("Python依赖情况", "ldd $(command -v python) || echo 'ldd命令不可用'", 300),
+            ]
+            with ThreadPoolExecutor(max_workers=len(diag_cmds)) as executor:
+                futures = {
+                    executor.submit(container.exec_run, ["bash", "-c", cmd]): (name, limit)
+                    for name, cmd, limit in diag_cmds
+                }
+                for future in as_completed(futures):
+                    name, limit = futures[future]
                     try:
-                        log_cmd = "tail -n 50 /var/log/jupyter.log || true"
-                        log_result = container.exec_run(log_cmd)
-                        log_output = log_result.output.decode()
-                        logger.info(f"Jupyter日志: {log_output[:500]}...")
-                        
-                        # 检查是否有错误信息
-                        if "Error:" in log_output or "Exception:" in log_output:
-                            logger.warning(f"Jupyter日志中发现错误: {log_output}")
+                        diag_output = future.result().output.decode('utf-8', errors='ignore')
+                        logger.info(f"{name}: {diag_output[:limit]}")
                     except Exception as e:
-                        logger.warning(f"读取日志时出错: {str(e)}")
-                    
-                    # 检查端口是否在监听
-                    netstat_cmd = f"netstat -tlpn | grep {port} || ss -tlpn | grep {port} || true"
-                    netstat_result = container.exec_run(netstat_cmd)
-                    netstat_output = netstat_result.output.decode()
-                    
-                    if str(port) in netstat_output:
-                        logger.info(f"端口 {port} 已在监听: {netstat_output.strip()}")
-                        
-                        # 尝试通过curl访问服务
-                        curl_cmd = f"curl -s -I http://localhost:{port}/api || echo 'curl失败'"
-                        curl_result = container.exec_run(curl_cmd)
-                        curl_output = curl_result.output.decode()
-                        logger.info(f"curl测试结果: {curl_output[:200]}")
-                        
-                        # 即使curl测试失败，如果端口在监听就认为服务已启动
-                        logger.info("Jupyter服务已成功启动")
-                        return {
-                            'status': 'success',
-                            'port': port,
-                            'token': token
-                        }
-                    else:
-                        logger.warning(f"进程存在但端口 {port} 未监听，继续等待")
-                else:
-                    logger.warning(f"未检测到Jupyter进程，重试 {i+1}/{max_retries}")
-                
-                # 如果是最后几次重试，收集更详细的诊断信息
-                if i >= max_retries - 3:
-                    logger.info("收集详细诊断信息")
-                    # 检查系统资源
-                    mem_cmd = "free -m || true"
-                    mem_result = container.exec_run(mem_cmd)
-                    logger.info(f"内存状态: {mem_result.output.decode()}")
-                    
-                    disk_cmd = "df -h || true"
-                    disk_result = container.exec_run(disk_cmd)
-                    logger.info(f"磁盘状态: {disk_result.output.decode()}")
-                    
-                    # 检查Python和pip环境
-                    py_pkg_cmd = f"{pip_cmd} list || true"
-                    py_pkg_result = container.exec_run(py_pkg_cmd)
-                    logger.info(f"Python包列表: {py_pkg_result.output.decode()[:300]}...")
-                    
-                    # 尝试直接运行jupyter检查错误
-                    try_jupyter_cmd = f"{jupyter_path} notebook --help > /tmp/jupyter_help.log 2>&1 || echo 'jupyter命令失败'"
-                    container.exec_run(try_jupyter_cmd)
-                    help_result = container.exec_run("cat /tmp/jupyter_help.log || true")
-                    logger.info(f"Jupyter帮助输出: {help_result.output.decode()[:300]}...")
-                    
-                    # 检查是否缺少依赖
-                    ldd_cmd = f"ldd $(which python) || echo 'ldd命令不可用'"
-                    ldd_result = container.exec_run(ldd_cmd)
-                    logger.info(f"Python依赖情况: {ldd_result.output.decode()[:300]}")
+                        logger.warning(f"获取{name}失败: {str(e)}")
             
             # 如果所有重试均失败，尝试一种替代方法作为最后的努力
             logger.warning("所有常规方法都失败，尝试替代启动方法")
             
-            # 尝试使用python -m方式启动
-            alt_start_cmd = f"python -m jupyter notebook --ip=0.0.0.0 --port={port} --no-browser --allow-root --config=/root/.jupyter/jupyter_notebook_config.py > /var/log/jupyter_alt.log 2>&1 &"
-            container.exec_run(["bash", "-c", alt_start_cmd])
-            
-            # 再等待一会儿
-            time.sleep(10)
+            # 尝试使用python -m方式启动，exec替换掉bash，exec实例的运行状态即为Jupyter进程的状态
+            alt_start_cmd = f"exec python -m jupyter notebook --ip=0.0.0.0 --port={port} --no-browser --allow-root --config=/root/.jupyter/jupyter_notebook_config.py > /var/log/jupyter_alt.log 2>&1"
+            alt_exec_id = self.api.exec_create(container.id, ["bash", "-c", alt_start_cmd])['Id']
+            self.api.exec_start(alt_exec_id, detach=True)
+            
+            # 以指数退避(0.1秒起，最长1秒)等待最多10秒，端口开始监听或进程退出时提前结束
+            delay = 0.1
+            alt_deadline = time.monotonic() + 10
+            while time.monotonic() < alt_deadline:
+                time.sleep(delay)
+                delay = min(delay * 1.5, 1.0)
+                if not self.api.exec_inspect(alt_exec_id).get('Running'):
+                    break
+                ss_result = container.exec_run(ss_cmd)
+                if ss_result.exit_code == 0 and ss_result.output.strip():
+                    break
             
-            # 最后检查
-            final_ps_cmd = "ps aux | grep 'jupyter-notebook' | grep -v grep || true"
-            final_ps_result = container.exec_run(final_ps_cmd)
-            if 'jupyter-notebook' in final_ps_result.output.decode():
+            # 最后检查进程是否仍在运行，无需在容器内执行ps
+            if self.api.exec_inspect(alt_exec_id).get('Running'):
                 logger.info("使用替代方法成功启动Jupyter")
                 return {
                     'status': 'success',
@@ -2545,13 +3680,20 @@ EOL"""
                 }
             
             # 收集所有失败原因
-            error_msg = f'启动Jupyter服务失败: 服务未在{max_retries * retry_interval}秒内就绪'
+            error_msg = f'启动Jupyter服务失败: 服务未在{start_timeout}秒内就绪'
             logger.error(error_msg)
             
-            # 获取最终的日志
-            final_log_cmd = "cat /var/log/jupyter.log /var/log/jupyter_alt.log 2>/dev/null || true"
-            final_log_result = container.exec_run(final_log_cmd)
-            logger.error(f"最终Jupyter日志: {final_log_result.output.decode()[:500]}")
+            # 获取最终的日志，jupyter.log已在跟踪时读取，替代方法的日志直接通过归档接口读取
+            import io
+            import tarfile
+            alt_log = ''
+            try:
+                bits, _ = container.get_archive('/var/log/jupyter_alt.log')
+                with tarfile.open(fileobj=io.BytesIO(b''.join(bits))) as tar:
+                    alt_log = tar.extractfile(tar.next()).read().decode('utf-8', errors='ignore')
+            except (DockerException, tarfile.TarError, AttributeError) as e:
+                logger.warning(f"读取替代方法日志失败: {str(e)}")
+            logger.error(f"最终Jupyter日志: {log_output[-500:]}\n{alt_log[-500:]}")
             
             return {
                 'status': 'error',
@@ -2567,6 +3709,32 @@ EOL"""
                 'error_details': str(e)
             } 
 
+    def _add_china_mirrors_cached(self, dockerfile_content):
+        """
+        带缓存的_add_china_mirrors，相同内容的Dockerfile(如用户重试构建)直接复用上次的转换结果
+        
+        Args:
+            dockerfile_content (str): 原始Dockerfile内容
+            
+        Returns:
+            str: 添加了镜像源配置的Dockerfile内容
+        """
+        if not dockerfile_content:
+            return self._add_china_mirrors(dockerfile_content)
+        
+        key = hashlib.blake2b(dockerfile_content.encode('utf-8'), digest_size=16).digest()
+        with DockerClient._mirrors_cache_lock:
+            if key in DockerClient._mirrors_cache:
+                DockerClient._mirrors_cache.move_to_end(key)
+                return DockerClient._mirrors_cache[key]
+        
+        result = self._add_china_mirrors(dockerfile_content)
+        with DockerClient._mirrors_cache_lock:
+            DockerClient._mirrors_cache[key] = result
+            if len(DockerClient._mirrors_cache) > self.MIRRORS_CACHE_SIZE:
+                DockerClient._mirrors_cache.popitem(last=False)
+        return result
+    
     def _add_china_mirrors(self, dockerfile_content):
         """
         在Dockerfile中添加中国区镜像源配置
@@ -2600,8 +3768,7 @@ EOL"""
                     if 'nvidia' in base_image or 'cuda' in base_image:
                         is_cuda_image = True
                         # 尝试提取CUDA版本
-                        import re
-                        cuda_match = re.search(r'cuda:?(\d+\.\d+)', base_image)
+                        cuda_match = _DF_CUDA_VER_RE.search(base_image)
                         if cuda_match:
                             cuda_version = cuda_match.group(1)
                             self.logger.info(f"检测到CUDA基础镜像，版本: {cuda_version}")
@@ -2852,14 +4019,14 @@ RUN mkdir -p /root/.pip && \\
                 line_lower = line.lower()
                 if 'torch==' in line_lower:
                     # 尝试提取PyTorch版本
-                    match = re.search(r'torch==(\d+\.\d+\.\d+)', line)
+                    match = _DF_TORCH_VER_RE.search(line)
                     if match:
                         pytorch_version = match.group(1)
                         self.logger.info(f"检测到PyTorch版本: {pytorch_version}")
                 
                 if 'cu' in line_lower and ('--index-url' in line_lower or 'index-url' in line_lower):
                     # 尝试提取CUDA版本
-                    match = re.search(r'cu(\d+)', line_lower)
+                    match = _DF_CU_INDEX_RE.search(line_lower)
                     if match:
                         cuda_version_no_dots = match.group(1)
                         # 转换为标准格式 (例如: 116 -> 11.6)
@@ -3077,32 +4244,22 @@ CMD ["python", "-c", "print('Emergency Dockerfile after repair failure')"]
             Dict: 执行结果，包含 success, exit_code, output 字段
         """
         try:
-            # 获取容器
-            container = self.client.containers.get(container_id)
-            if not container:
-                return {
-                    'success': False,
-                    'error': f"找不到容器: {container_id}",
-                    'exit_code': -1,
-                    'output': ''
-                }
-            
             self.logger.info(f"在容器 {container_id} 中执行命令: {cmd}")
             if workdir:
                 self.logger.info(f"工作目录: {workdir}")
             
             # 执行命令
-            environment = {'PATH': '/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin'}
             exec_kwargs = {
-                'environment': environment
+                'environment': self._CONTAINER_ENV
             }
             if workdir:
                 exec_kwargs['workdir'] = workdir
                 
-            result = container.exec_run(cmd, **exec_kwargs)
-            
-            exit_code = result.exit_code
-            output = result.output.decode('utf-8', errors='replace') if result.output else ''
+            # 直接使用低级exec接口，省去获取容器对象的inspect请求
+            exec_id = self.api.exec_create(container_id, cmd, **exec_kwargs)['Id']
+            raw_output = self.api.exec_start(exec_id)
+            exit_code = self.api.exec_inspect(exec_id)['ExitCode']
+            output = raw_output.decode('utf-8', errors='replace') if raw_output else ''
             
             self.logger.info(f"命令执行完成，退出码: {exit_code}")
             if exit_code != 0:
@@ -3116,6 +4273,7 @@ CMD ["python", "-c", "print('Emergency Dockerfile after repair failure')"]
                 
         except Exception as e:
             self.logger.error(f"在容器中执行命令时出错: {str(e)}")
+            import traceback
             traceback.print_exc()
             return {
                 'success': False,
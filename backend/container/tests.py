@@ -3,13 +3,26 @@ This module contains tests for the container management functionality.
 包含容器管理功能的测试用例。
 """
 
-from django.test import TestCase
+from django.test import TestCase, SimpleTestCase
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from .models import DockerImage, ContainerInstance, ResourceQuota
-from .docker_ops import DockerClient
+from .docker_ops import DockerClient, ParsedTag, _parse_tag
+import io
+import logging
+import os
+import queue
+import socket
+import selectors
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
 import unittest
+from collections import OrderedDict
+from types import SimpleNamespace
 from unittest.mock import patch, MagicMock
 
 User = get_user_model()
@@ -70,6 +83,503 @@ class DockerOperationsTest(TestCase):
         except Exception as e:
             self.fail(f"容器生命周期测试失败: {str(e)}")
 
+def make_offline_docker_client():
+    """创建不连接Docker服务的DockerClient，只用于测试不访问守护进程的逻辑"""
+    # DockerClient.__new__会连接Docker，这里绕过它
+    docker_client = object.__new__(DockerClient)
+    docker_client.logger = logging.getLogger(__name__)
+    return docker_client
+
+def make_image_docker_client(images):
+    """
+    创建使用模拟镜像列表的DockerClient
+    
+    Args:
+        images: [(镜像ID, [标签...])]，作为api.images()的返回值
+    """
+    docker_client = make_offline_docker_client()
+    docker_client._images_cache = None
+    docker_client._image_index = None
+    docker_client._images_cache_lock = threading.Lock()
+    docker_client.api = MagicMock()
+    docker_client.api.images.return_value = [
+        {'Id': image_id, 'RepoTags': tags, 'Size': 0, 'Created': 0} for image_id, tags in images
+    ]
+    docker_client.client = MagicMock()
+    docker_client.client.images.prepare_model.side_effect = lambda attrs: SimpleNamespace(
+        id=attrs['Id'], tags=attrs['RepoTags'], attrs=attrs
+    )
+    docker_client._ensure_event_pump = lambda: None
+    return docker_client
+
+def make_container_docker_client(container):
+    """
+    创建使用模拟api的DockerClient，get_container总是返回给定的容器对象
+    
+    Args:
+        container: 模拟的容器对象，需要id和name属性
+    """
+    docker_client = make_offline_docker_client()
+    docker_client._container_cache = OrderedDict()
+    docker_client._container_cache_lock = threading.Lock()
+    docker_client._container_meta_cache = {}
+    docker_client._prev_cpu = {}
+    docker_client._stats_cache = {}
+    docker_client._events = {}
+    docker_client._events_lock = threading.Lock()
+    docker_client._event_thread = None
+    docker_client._event_stream_ready = threading.Event()
+    docker_client.api = MagicMock()
+    docker_client.client = MagicMock()
+    docker_client.client.containers.get.return_value = container
+    return docker_client
+
+class ImageTagParseTest(SimpleTestCase):
+    """测试镜像标签解析和标签索引"""
+    
+    def test_parse_repo_tag(self):
+        """测试解析repo:tag和带registry前缀的标签"""
+        self.assertEqual(_parse_tag("python:3.9-slim"), ParsedTag("python", "3.9-slim"))
+        self.assertEqual(_parse_tag("docker.io/library/python:3.9-slim"), ParsedTag("python", "3.9-slim"))
+    
+    def test_parse_registry_with_port(self):
+        """测试带端口的registry不会被当作版本"""
+        self.assertEqual(_parse_tag("localhost:5000/team/app:1.0"), ParsedTag("app", "1.0"))
+        self.assertIsNone(_parse_tag("localhost:5000/app"))
+    
+    def test_parse_digest_ref(self):
+        """测试摘要引用没有版本部分"""
+        self.assertIsNone(_parse_tag("python@sha256:0123456789abcdef"))
+        self.assertIsNone(_parse_tag("python"))
+    
+    def test_image_index(self):
+        """测试标签索引只按完整的路径段匹配后缀"""
+        docker_client = make_image_docker_client([
+            ('sha256:a', ['docker.io/library/python:3.9-slim']),
+            ('sha256:b', ['localhost:5000/team/app:1.0']),
+        ])
+        index = docker_client._get_image_index()
+        self.assertEqual(index.by_suffix['library/python:3.9-slim'][0], 'docker.io/library/python:3.9-slim')
+        self.assertEqual(index.by_suffix['python:3.9-slim'][0], 'docker.io/library/python:3.9-slim')
+        self.assertEqual(index.by_suffix['app:1.0'][0], 'localhost:5000/team/app:1.0')
+        self.assertEqual(index.by_name_version[ParsedTag("app", "1.0")][1].id, 'sha256:b')
+        # 快照未变化时复用同一份索引
+        self.assertIs(docker_client._get_image_index(), index)
+    
+    def test_image_index_loose_suffix(self):
+        """测试只按完整的路径段建立后缀索引，"mypython:3.9-slim"不能按"python:3.9-slim"查到"""
+        docker_client = make_image_docker_client([('sha256:c', ['mypython:3.9-slim'])])
+        index = docker_client._get_image_index()
+        self.assertNotIn('python:3.9-slim', index.by_suffix)
+        self.assertNotIn(ParsedTag("python", "3.9-slim"), index.by_name_version)
+
+class FindLocalImageTest(SimpleTestCase):
+    """测试在本地镜像中查找匹配的镜像"""
+    
+    def setUp(self):
+        """测试前准备工作"""
+        self.docker_client = make_image_docker_client([
+            ('sha256:exact', ['python:3.9-slim']),
+            ('sha256:registry', ['docker.io/library/ubuntu:22.04']),
+            ('sha256:port', ['localhost:5000/team/app:1.0']),
+            ('sha256:loose', ['mypython:3.10-slim']),
+            ('sha256:base', ['node:18.19-alpine']),
+        ])
+    
+    def find(self, image_name, tag):
+        img = self.docker_client._find_local_image(image_name, tag)
+        return img.id if img is not None else None
+    
+    def test_exact_match(self):
+        """测试完全匹配"""
+        self.assertEqual(self.find('python', '3.9-slim'), 'sha256:exact')
+    
+    def test_registry_prefix_match(self):
+        """测试匹配带registry前缀的标签"""
+        self.assertEqual(self.find('ubuntu', '22.04'), 'sha256:registry')
+        self.assertEqual(self.find('library/ubuntu', '22.04'), 'sha256:registry')
+        self.assertEqual(self.find('team/app', '1.0'), 'sha256:port')
+    
+    def test_base_version_match(self):
+        """测试按基础版本号匹配"""
+        self.assertEqual(self.find('node', '18.19-slim'), 'sha256:base')
+    
+    def test_loose_suffix_not_matched(self):
+        """测试名称只是标签后缀的一部分时不匹配"""
+        self.assertIsNone(self.find('python', '3.10-slim'))
+        self.assertIsNone(self.find('ython', '3.9-slim'))
+    
+    def test_images_listed_once(self):
+        """测试多次查找复用同一份镜像列表"""
+        self.find('python', '3.9-slim')
+        self.find('ubuntu', '22.04')
+        self.docker_client.api.images.assert_called_once()
+
+class JupyterImageTest(SimpleTestCase):
+    """测试预装Jupyter的派生镜像对用户隐藏并随基础镜像删除"""
+    
+    def setUp(self):
+        """测试前准备工作"""
+        base_id = 'sha256:' + 'ab' * 32
+        self.derived = 'mlride-jupyter:' + 'ab' * 32
+        self.docker_client = make_image_docker_client([
+            (base_id, ['python:3.9-slim']),
+            ('sha256:' + 'cd' * 32, [self.derived]),
+        ])
+        self.docker_client.api.images.return_value[1]['Labels'] = {'mlride.jupyter.base': base_id}
+        self.docker_client.api.inspect_image.return_value = {'Id': base_id, 'RepoTags': ['python:3.9-slim']}
+        self.docker_client._image_present_cache = OrderedDict()
+    
+    def test_derived_image_hidden(self):
+        """测试镜像列表和镜像查找中不包含派生镜像"""
+        tags = [tag for image in self.docker_client.list_images() for tag in image['tags']]
+        self.assertEqual(tags, ['python:3.9-slim'])
+        self.assertIsNone(self.docker_client._find_local_image('mlride-jupyter', 'ab' * 32))
+    
+    def test_remove_base_removes_derived(self):
+        """测试删除基础镜像时先删除派生镜像"""
+        self.docker_client.remove_image('python:3.9-slim')
+        self.docker_client.api.remove_image.assert_called_once_with(self.derived)
+        self.docker_client.client.images.remove.assert_called_once_with('python:3.9-slim', force=False)
+    
+    def test_untag_keeps_derived(self):
+        """测试只移除基础镜像的一个标签时保留派生镜像"""
+        self.docker_client.api.inspect_image.return_value['RepoTags'].append('python:3.9')
+        self.docker_client.remove_image('python:3.9-slim')
+        self.docker_client.api.remove_image.assert_not_called()
+
+class EventSubscriptionTest(SimpleTestCase):
+    """测试容器事件的订阅和分发"""
+    
+    def setUp(self):
+        """测试前准备工作"""
+        self.container = SimpleNamespace(id='e' * 64, name='jupyter-1')
+        self.docker_client = make_container_docker_client(self.container)
+        self.docker_client._event_stream_ready.set()
+        self.docker_client._ensure_event_pump = lambda: None
+    
+    def test_event_pump_dispatches_to_every_subscriber(self):
+        """测试同一容器的每个订阅者都收到事件"""
+        first = self.docker_client._subscribe_events(self.container.id)
+        second = self.docker_client._subscribe_events(self.container.id)
+        self.docker_client.client.events.return_value = iter([
+            {'Type': 'container', 'Action': 'start', 'id': self.container.id},
+            {'Type': 'container', 'Action': 'start', 'id': 'other'},
+        ])
+        self.docker_client._event_pump()
+        for event_queue in (first, second):
+            self.assertEqual(event_queue.get_nowait()['Action'], 'start')
+            self.assertTrue(event_queue.empty())
+    
+    def test_unsubscribe_keeps_other_subscribers(self):
+        """测试取消订阅只移除自己的队列"""
+        first = self.docker_client._subscribe_events(self.container.id)
+        second = self.docker_client._subscribe_events(self.container.id)
+        self.docker_client._unsubscribe_events(self.container.id, first)
+        self.assertEqual(self.docker_client._events[self.container.id], [second])
+        self.docker_client._unsubscribe_events(self.container.id, second)
+        self.assertNotIn(self.container.id, self.docker_client._events)
+    
+    def test_wait_for_pre_queued_event(self):
+        """测试已在队列中的事件立即返回，不匹配的事件被跳过"""
+        event_queue = queue.Queue()
+        event_queue.put({'Action': 'attach'})
+        event_queue.put({'Action': 'die'})
+        started = time.monotonic()
+        event = self.docker_client._wait_for_event(event_queue, {'die', 'oom'}, timeout=5)
+        self.assertEqual(event['Action'], 'die')
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertIsNone(self.docker_client._wait_for_event(event_queue, {'die'}, timeout=0.01))
+
+class StartContainerTest(SimpleTestCase):
+    """测试启动容器"""
+    
+    def setUp(self):
+        """测试前准备工作"""
+        self.container = MagicMock(id='a' * 64)
+        self.container.name = 'jupyter-1'
+        self.docker_client = make_container_docker_client(self.container)
+        self.running = {
+            'State': {'Running': True},
+            'HostConfig': {'PortBindings': {'8888/tcp': [{'HostPort': ''}]}},
+            'NetworkSettings': {
+                'IPAddress': '172.17.0.2',
+                'Ports': {'8888/tcp': [{'HostIp': '0.0.0.0', 'HostPort': '32768'}]}
+            }
+        }
+    
+    def test_already_running(self):
+        """测试容器已在运行时不等待事件，直接返回端口映射"""
+        self.docker_client.api.inspect_container.return_value = self.running
+        started = time.monotonic()
+        result = self.docker_client.start_container('jupyter-1')
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(result, {'status': 'running', 'port_mappings': {'8888/tcp': '32768'}})
+        self.container.start.assert_called_once()
+        self.docker_client.api.inspect_container.assert_called_once_with(self.container.id)
+        self.assertEqual(self.docker_client._events, {})
+    
+    def test_waits_for_port_binding(self):
+        """测试端口尚未绑定时继续查询，直到端口映射出现"""
+        pending = {'State': {'Running': True}, 'HostConfig': self.running['HostConfig'], 'NetworkSettings': {}}
+        self.docker_client.api.inspect_container.side_effect = [pending, pending, self.running]
+        result = self.docker_client.start_container('jupyter-1')
+        self.assertEqual(result['port_mappings'], {'8888/tcp': '32768'})
+        self.assertEqual(self.docker_client.api.inspect_container.call_count, 3)
+
+class ContainerStatsTest(SimpleTestCase):
+    """测试容器资源使用统计"""
+    
+    def setUp(self):
+        """测试前准备工作"""
+        self.container = SimpleNamespace(id='b' * 64, name='jupyter-1', status='running')
+        self.docker_client = make_container_docker_client(self.container)
+    
+    @staticmethod
+    def sample(total_usage, system_cpu_usage):
+        return {
+            'cpu_stats': {'cpu_usage': {'total_usage': total_usage}, 'system_cpu_usage': system_cpu_usage},
+            'memory_stats': {'usage': 256, 'limit': 1024}
+        }
+    
+    def test_cpu_delta_between_samples(self):
+        """测试第二次采样按与上一次采样的差值计算CPU使用率"""
+        self.docker_client.api.stats.side_effect = [self.sample(100, 1000), self.sample(300, 2000)]
+        first = self.docker_client.get_container_stats('jupyter-1', min_interval=0)
+        second = self.docker_client.get_container_stats('jupyter-1', min_interval=0)
+        self.assertEqual(first['cpu_usage_percent'], 10.0)
+        self.assertEqual(second['cpu_usage_percent'], 20.0)
+        self.assertEqual(second['memory_usage_percent'], 25.0)
+        self.docker_client.api.stats.assert_called_with(self.container.id, stream=False, one_shot=True)
+    
+    def test_cache_shared_across_ids_and_purged(self):
+        """测试以名称和完整ID查询共用统计缓存，删除容器时一并清除"""
+        self.docker_client.api.stats.return_value = self.sample(100, 1000)
+        self.docker_client.get_container_stats('jupyter-1')
+        cached = self.docker_client.get_container_stats(self.container.id, jitter=0)
+        self.assertEqual(cached['container_id'], self.container.id)
+        self.docker_client.api.stats.assert_called_once()
+        self.docker_client._cache_container(self.container, 'jupyter-1')
+        self.docker_client.remove_container('jupyter-1')
+        self.assertEqual(self.docker_client._stats_cache, {})
+        self.assertEqual(self.docker_client._prev_cpu, {})
+
+class PortProbeTest(SimpleTestCase):
+    """测试基于选择器的端口就绪探测"""
+    
+    def setUp(self):
+        """测试前准备工作"""
+        self.docker_client = make_offline_docker_client()
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(1)
+        self.addCleanup(self.listener.close)
+        # 绑定后立即关闭得到一个没有服务监听的端口
+        closed = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        closed.bind(('127.0.0.1', 0))
+        self.closed_port = closed.getsockname()[1]
+        closed.close()
+    
+    def test_listening_port_wins(self):
+        """测试同时探测多个端口时返回正在监听的端口"""
+        open_port = self.listener.getsockname()[1]
+        sel = selectors.DefaultSelector()
+        self.addCleanup(sel.close)
+        addr_cache = {}
+        for port in (self.closed_port, open_port):
+            self.docker_client._open_port_probe(sel, '127.0.0.1', port, addr_cache)
+        ready = None
+        deadline = time.monotonic() + 2
+        while ready is None and sel.get_map() and time.monotonic() < deadline:
+            ready = self.docker_client._poll_port_probes(sel, 0.5)
+        self.assertEqual(ready, ('127.0.0.1', open_port))
+        self.assertIn(('127.0.0.1', open_port), addr_cache)
+    
+    def test_refused_port_not_ready(self):
+        """测试连接被拒绝的端口不视为就绪，完成的探测被注销"""
+        sel = selectors.DefaultSelector()
+        self.addCleanup(sel.close)
+        self.docker_client._open_port_probe(sel, '127.0.0.1', self.closed_port)
+        self.assertIsNone(self.docker_client._poll_port_probes(sel, 1))
+        self.assertEqual(len(sel.get_map()), 0)
+
+class CopyFromContainerTest(SimpleTestCase):
+    """测试从容器流式复制文件"""
+    
+    def setUp(self):
+        """测试前准备工作"""
+        self.container = SimpleNamespace(id='c' * 64, name='jupyter-1')
+        self.docker_client = make_container_docker_client(self.container)
+        self.docker_client.COPY_PIPE_BUFFER_SIZE = 4096
+        self.target_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.target_dir, ignore_errors=True)
+    
+    def make_response(self, files):
+        """构造返回tar流的模拟响应，按小块返回数据"""
+        buf = io.BytesIO()
+        with tarfile.open(fileobj=buf, mode='w') as tar:
+            for name, data in files:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        data = buf.getvalue()
+        response = MagicMock()
+        closed = []
+        
+        def iter_content(chunk_size):
+            try:
+                for i in range(0, len(data), 512):
+                    yield data[i:i + 512]
+            finally:
+                closed.append(True)
+        
+        response.iter_content.side_effect = iter_content
+        response.chunks_closed = closed
+        self.docker_client.api._get.return_value = response
+        return response
+    
+    def test_copy_first_member(self):
+        """测试提取归档中的第一个文件并重命名为目标文件名，读取结束后关闭响应"""
+        payload = os.urandom(20000)
+        response = self.make_response([('data.bin', payload), ('extra.bin', os.urandom(100000))])
+        target = os.path.join(self.target_dir, 'out', 'copy.bin')
+        self.assertTrue(self.docker_client.copy_from_container('jupyter-1', '/workspace/data.bin', target))
+        with open(target, 'rb') as f:
+            self.assertEqual(f.read(), payload)
+        response.close.assert_called_once()
+        self.assertEqual(response.chunks_closed, [True])
+        self.assertEqual(self.docker_client.api._get.call_args.kwargs['params'], {'path': '/workspace/data.bin'})
+    
+    def test_empty_archive(self):
+        """测试空归档返回失败"""
+        response = self.make_response([])
+        target = os.path.join(self.target_dir, 'copy.bin')
+        self.assertFalse(self.docker_client.copy_from_container('jupyter-1', '/workspace/missing', target))
+        self.assertFalse(os.path.exists(target))
+        response.close.assert_called_once()
+
+class SimplifiedDockerfileTest(SimpleTestCase):
+    """测试简化版Dockerfile的生成"""
+    
+    def setUp(self):
+        """测试前准备工作"""
+        self.docker_client = make_offline_docker_client()
+    
+    def simplify(self, dockerfile):
+        return self.docker_client._create_simplified_dockerfile(dockerfile).splitlines()
+    
+    def test_pip_install_removed(self):
+        """测试移除pip安装命令"""
+        lines = self.simplify("FROM python:3.9-slim\nRUN pip install numpy\nWORKDIR /app")
+        self.assertIn("# 已移除(需要网络): RUN pip install numpy", lines)
+        self.assertIn("WORKDIR /app", lines)
+    
+    def test_lowercase_instruction_removed(self):
+        """测试小写的RUN指令同样按规则移除"""
+        lines = self.simplify("FROM python:3.9-slim\nrun pip install numpy\nrun apt-get update")
+        self.assertIn("# 已移除(需要网络): run pip install numpy", lines)
+        self.assertIn("# 已移除(需要网络): run apt-get update", lines)
+    
+    def test_continuation_removed_as_whole(self):
+        """测试含续行的指令整条移除"""
+        lines = self.simplify("FROM python:3.9-slim\nRUN echo start && \\\n    pip install numpy")
+        self.assertIn("# 已移除(需要网络): RUN echo start && \\", lines)
+        self.assertIn("# 已移除(需要网络):     pip install numpy", lines)
+    
+    def test_mkdir_and_other_instructions_kept(self):
+        """测试保留目录创建命令和其他指令"""
+        lines = self.simplify("FROM python:3.9-slim\nENV A=1\nRUN mkdir -p /data\nCOPY . /app\nCMD [\"python\"]")
+        for line in ("ENV A=1", "RUN mkdir -p /data", "COPY . /app", 'CMD ["python"]'):
+            self.assertIn(line, lines)
+    
+    def test_non_run_pip_install_removed(self):
+        """测试RUN以外的指令中包含pip安装时同样移除"""
+        lines = self.simplify(
+            "FROM python:3.9-slim\n"
+            "CMD pip install flask && python app.py\n"
+            "ENTRYPOINT [\"sh\", \"-c\", \"pip install flask\"]\n"
+            "ONBUILD RUN pip install numpy"
+        )
+        self.assertIn("# 已移除(需要网络): CMD pip install flask && python app.py", lines)
+        self.assertIn('# 已移除(需要网络): ENTRYPOINT ["sh", "-c", "pip install flask"]', lines)
+        self.assertIn("# 已移除(需要网络): ONBUILD RUN pip install numpy", lines)
+    
+    def test_network_arg_removed(self):
+        """测试移除与网络相关的ARG"""
+        lines = self.simplify("FROM python:3.9-slim\narg HTTP_PROXY\nARG VERSION=1")
+        self.assertIn("# 已移除(可能与网络相关): arg HTTP_PROXY", lines)
+        self.assertIn("ARG VERSION=1", lines)
+
+class BaseImageParseTest(SimpleTestCase):
+    """测试从Dockerfile中解析基础镜像"""
+    
+    def setUp(self):
+        """测试前准备工作"""
+        self.docker_client = make_offline_docker_client()
+    
+    def test_multi_stage(self):
+        """测试多阶段构建跳过阶段别名和scratch"""
+        dockerfile = (
+            "FROM --platform=linux/amd64 python:3.9-slim AS build\n"
+            "FROM build\n"
+            "from node:18 as web\n"
+            "FROM scratch\n"
+        )
+        self.assertEqual(
+            self.docker_client._parse_base_images_from_dockerfile(dockerfile),
+            ["python:3.9-slim", "node:18"]
+        )
+    
+    def test_heredoc_and_continuation_ignored(self):
+        """测试heredoc和续行中的from语句不被当作基础镜像"""
+        dockerfile = (
+            "FROM python:3.9-slim\n"
+            "RUN python - <<EOF\n"
+            "from os import path\n"
+            "FROM ubuntu\n"
+            "EOF\n"
+            "RUN echo start \\\n"
+            "    from debian\n"
+        )
+        self.assertEqual(
+            self.docker_client._parse_base_images_from_dockerfile(dockerfile),
+            ["python:3.9-slim"]
+        )
+
+class ContainerCacheTest(SimpleTestCase):
+    """测试容器对象缓存和端点缓存的失效"""
+    
+    def setUp(self):
+        """测试前准备工作"""
+        self.docker_client = make_offline_docker_client()
+        self.docker_client._container_cache = OrderedDict()
+        self.docker_client._container_cache_lock = threading.Lock()
+        self.docker_client._container_meta_cache = {}
+        self.container = SimpleNamespace(
+            id='f' * 64,
+            name='jupyter-1',
+            attrs={'NetworkSettings': {
+                'IPAddress': '172.17.0.2',
+                'Ports': {'8888/tcp': [{'HostIp': '0.0.0.0', 'HostPort': '32768'}]}
+            }}
+        )
+    
+    def test_invalidate_by_name_clears_endpoint(self):
+        """测试按名称失效时清除以完整ID缓存的端点"""
+        self.docker_client._cache_container(self.container, 'jupyter-1')
+        self.docker_client._get_container_endpoint(self.container)
+        self.docker_client._invalidate_container('jupyter-1')
+        self.assertEqual(self.docker_client._container_meta_cache, {})
+        self.assertEqual(len(self.docker_client._container_cache), 0)
+    
+    def test_invalidate_by_uncached_name_clears_endpoint(self):
+        """测试名称未作为缓存键时仍能按名称清除端点缓存"""
+        self.docker_client._cache_container(self.container)
+        self.docker_client._get_container_endpoint(self.container)
+        self.docker_client._invalidate_container('jupyter-1')
+        self.assertEqual(self.docker_client._container_meta_cache, {})
+        self.assertEqual(len(self.docker_client._container_cache), 0)
+
 class ContainerAPITest(APITestCase):
     """测试容器管理API"""
     